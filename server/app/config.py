@@ -11,6 +11,9 @@ if env_path.exists():
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Optional JWT signing secret, enables local token verification
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+
 # Razorpay configuration
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_SECRET")
@@ -44,4 +47,82 @@ DEFAULT_FFMPEG_TIMEOUT = 300  # 5 minutes
 # Cache configuration
 MAX_CACHE_SIZE = 5 * 1024 * 1024 * 1024  # 5GB default
 CLEANUP_THRESHOLD = 0.8  # Cleanup when 80% full
-CLEANUP_TARGET = 0.7  # Clean down to 70% of max size
\ No newline at end of file
+CLEANUP_TARGET = 0.7  # Clean down to 70% of max size
+
+# Auth cache configuration
+AUTH_CACHE_MAX_SIZE = 10000  # Max cached tokens
+AUTH_CACHE_TTL = 300  # Seconds, never longer than the token's exp
+
+# In-process metadata cache (cached_info / cached_formats / cached_playlist)
+METADATA_CACHE_MAX_ENTRIES = 5000  # Per table
+METADATA_CACHE_TTL = 3600  # 1 hour
+
+# Extraction backend: "thread" or "process" (process escapes the GIL for CPU-bound parsing)
+EXTRACTION_BACKEND = os.getenv("EXTRACTION_BACKEND", "thread")
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "5"))
+
+# YoutubeDL instance pools (one per extraction profile)
+YDL_POOL_MAX_SIZE = EXTRACTION_WORKERS  # One instance per extraction thread, so none waits for the pool
+YDL_POOL_MAX_USES = 100  # Recycle an instance after this many extractions
+
+# Tiered video info extraction: the fast tier asks only these yt-dlp player clients,
+# the full tier asks every client and only runs when the fast tier misses quality tiers
+EXTRACTION_FAST_CLIENTS = os.getenv("EXTRACTION_FAST_CLIENTS", "default").split(",")
+
+# Search suggestion cache
+SUGGESTION_CACHE_MAX_ENTRIES = 20000  # Cached queries
+SUGGESTION_CACHE_TTL = 600  # 10 minutes
+SUGGESTION_UPSTREAM_CAP = 10  # Completions upstream returns at most; shorter lists are exhaustive
+SUGGESTION_DEBOUNCE_MS = 150  # Per-client keystroke window, 0 disables
+
+# Search result cache
+SEARCH_CACHE_MAX_ENTRIES = 2000  # Cached (kind, query) pairs
+SEARCH_CACHE_TTL = 900  # Fresh for 15 minutes
+SEARCH_CACHE_STALE_TTL = 3600  # Then served stale for up to 1 hour while refreshing
+
+# Concurrent yt-dlp downloads and how long finished jobs stay queryable (seconds)
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_JOB_RETENTION = 3600
+
+# Download scheduling: fair-share weight per plan class, and virtual time credited per second waited
+DOWNLOAD_CLASS_WEIGHTS = {"premium": 4, "paid": 2, "free": 1}
+DOWNLOAD_AGING_RATE = 0.05
+
+# Expired cache sweeper
+CACHE_TTL_DAYS = 30  # Rows and files older than this are removed
+CACHE_SWEEP_INTERVAL = 6 * 3600  # Seconds between sweeps
+CACHE_SWEEP_BATCH_SIZE = 200  # Rows deleted per request
+CACHE_SWEEP_BATCH_PAUSE = 0.5  # Seconds between batches
+
+# Cache stats: keep running totals in process, re-aggregated in the database after CACHE_STATS_RESYNC seconds
+CACHE_STATS_INCREMENTAL = True
+CACHE_STATS_RESYNC = 600
+
+# Rows per page when streaming cached_formats (kept under the PostgREST max-rows cap)
+CACHED_FORMATS_PAGE_SIZE = 500
+
+# Pricing plan catalog
+PLAN_CATALOG_REFRESH = 300  # Seconds between full reloads
+PLAN_CATALOG_REALTIME = os.getenv("PLAN_CATALOG_REALTIME", "false").lower() == "true"  # Also reload on change events
+
+# Seconds between flushes of buffered cached_formats access counts
+ACCESS_COUNT_FLUSH_INTERVAL = 30
+
+# Write-behind buffer for cache and download log inserts
+WRITE_BUFFER_FLUSH_INTERVAL = 0.2  # Seconds between bulk upserts
+WRITE_BUFFER_BATCH_ROWS = 100  # Rows per upsert, also flushes early once this many are queued
+WRITE_BUFFER_MAX_PENDING = 5000  # Writers wait for a flush beyond this many queued rows
+WRITE_BUFFER_RETRY_BASE = 0.5  # Seconds before the first retry of a failed write, doubling per failure
+WRITE_BUFFER_RETRY_MAX = 30  # Longest wait between retries; rows are kept until the database is back
+
+# Async PostgREST client: pooled connections and queries in flight at once.
+# Keep the pool modest, httpx scans every pooled connection for each request.
+SUPABASE_DB_MAX_CONNECTIONS = int(os.getenv("SUPABASE_DB_MAX_CONNECTIONS", "20"))
+SUPABASE_DB_CONCURRENCY = int(os.getenv("SUPABASE_DB_CONCURRENCY", "20"))
+SUPABASE_DB_TIMEOUT = 10
+
+# Playlist entries are extracted in windows of playlist_items, the first one served at once
+PLAYLIST_PAGE_SIZE = 100  # Default entries per /playlist/info page
+PLAYLIST_MAX_PAGE_SIZE = 500
+PLAYLIST_FIRST_WINDOW = 100  # Entries extracted before the first response
+PLAYLIST_MAX_WINDOW = 1600  # Later windows double up to this size
\ No newline at end of file
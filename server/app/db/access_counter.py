@@ -0,0 +1,138 @@
+import asyncio
+from app.logger import logger
+
+
+class AccessCounter:
+    """
+    Buffers cached_formats access counts in memory and flushes them in batches.
+
+    Cache hits only bump an in-process counter. Every `flush_interval`
+    seconds the pending counts are sent in one call to the
+    increment_format_access RPC (sql/access_counts.sql), which adds them
+    to access_count in the database, so concurrent readers and other
+    processes never lose increments. Counts that fail to flush are kept
+    and retried with the next batch.
+
+    The RPC only updates existing rows, so counts of a format whose row is
+    still queued in `write_buffer` are added to the queued row instead,
+    and counts of a row being written right now wait for the next flush.
+    """
+
+    def __init__(
+        self,
+        client,
+        rpc: str = "increment_format_access",
+        flush_interval: float = 30,
+        max_batch: int = 500,
+        write_buffer=None,
+        table: str = "cached_formats",
+    ) -> None:
+        self._client = client
+        self._write_buffer = write_buffer
+        self.table = table
+        self.rpc = rpc
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: dict[tuple[str, str], int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self.recorded = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.failures = 0
+
+    def record(self, video_id: str, tag: str, count: int = 1) -> None:
+        """Count an access to a cached format, without touching the database."""
+        key = (video_id, tag)
+        self._pending[key] = self._pending.get(key, 0) + count
+        self.recorded += count
+
+    def pending(self, video_id: str, tag: str) -> int:
+        """Accesses of a format recorded but not yet flushed."""
+        return self._pending.get((video_id, tag), 0)
+
+    def discard(self, video_id: str, tag: str) -> None:
+        """Forget unflushed accesses of a format whose row was removed."""
+        self._pending.pop((video_id, tag), None)
+
+    async def flush(self) -> int:
+        """
+        Send every pending count to the database.
+
+        Returns:
+            Number of accesses flushed
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            flushed = self._fold_into_buffer(batch)
+            if not batch:
+                self.flushes += 1
+                self.flushed += flushed
+                return flushed
+            hits = [{"video_id": video_id, "tag": tag, "count": count} for (video_id, tag), count in batch.items()]
+            try:
+                for start in range(0, len(hits), self.max_batch):
+                    chunk = hits[start:start + self.max_batch]
+                    await self._client.execute(self._client.rpc(self.rpc, {"hits": chunk}))
+                    for hit in chunk:
+                        del batch[(hit["video_id"], hit["tag"])]
+                        flushed += hit["count"]
+            except BaseException as e:
+                # Also on cancellation, so unsent counts are kept for the next flush
+                self.failures += isinstance(e, Exception)
+                logger.warning(f"Failed to flush {sum(batch.values())} format accesses, retrying later: {e!r}")
+                for key, count in batch.items():
+                    self._pending[key] = self._pending.get(key, 0) + count
+                if not isinstance(e, Exception):
+                    raise
+            self.flushes += 1
+            self.flushed += flushed
+            return flushed
+
+    def _fold_into_buffer(self, batch: dict[tuple[str, str], int]) -> int:
+        """Move counts of rows not written yet out of batch; return how many were folded into queued rows."""
+        if self._write_buffer is None:
+            return 0
+        folded = 0
+        for key in list(batch):
+            row = self._write_buffer.get(self.table, key)
+            if row is not None:
+                count = batch.pop(key)
+                self._write_buffer.merge(self.table, key, {"access_count": (row.get("access_count") or 0) + count})
+                folded += count
+            elif self._write_buffer.writing(self.table, key):
+                # The insert may not be committed yet, an update now could match nothing
+                self._pending[key] = self._pending.get(key, 0) + batch.pop(key)
+        return folded
+
+    def start(self) -> None:
+        """Start the periodic flush."""
+        if self.flush_interval > 0 and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded: stop() cancels the loop, not a flush that is under way
+            await asyncio.shield(self.flush())
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and send what is still pending, after a running flush completes."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        """Return buffered and flushed access counters."""
+        return {
+            "pending_formats": len(self._pending),
+            "pending_accesses": sum(self._pending.values()),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failures": self.failures,
+        }
@@ -0,0 +1,88 @@
+import asyncio
+import importlib.util
+import httpx
+from postgrest import AsyncPostgrestClient
+from app.logger import logger
+
+
+class AsyncRestClient:
+    """
+    Async PostgREST client with its own connection pool and concurrency limit.
+
+    Queries run on the event loop over a dedicated httpx.AsyncClient, so
+    they no longer take a worker thread from AnyIO's default limiter, which
+    sync routes and file I/O share. At most `max_concurrency` queries are in
+    flight at once; later ones wait for a slot. Build queries with table()
+    or rpc() and run them with execute(). HTTP/2 is used when the `h2`
+    package is installed, multiplexing queries over fewer connections.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 20,
+        max_concurrency: int = 20,
+        timeout: float = 10.0,
+        rest_path: str = "/rest/v1",
+    ) -> None:
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            http2=self.http2,
+        )
+        self._client = AsyncPostgrestClient(
+            f"{url.rstrip('/')}{rest_path}",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            http_client=self._http,
+        )
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.queries = 0
+        self.errors = 0
+
+    def table(self, name: str):
+        """Return a request builder for a table."""
+        return self._client.from_(name)
+
+    def rpc(self, function: str, params: dict[str, any] | None = None):
+        """Return a request builder for a database function call."""
+        return self._client.rpc(function, params or {})
+
+    async def execute(self, builder) -> any:
+        """
+        Run a query built with table() or rpc().
+
+        Raises:
+            postgrest.exceptions.APIError: If PostgREST rejects the query
+        """
+        self.waiting += 1
+        async with self._slots:
+            self.waiting -= 1
+            self.in_flight += 1
+            try:
+                return await builder.execute()
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.queries += 1
+
+    async def aclose(self) -> None:
+        """Close the connection pool."""
+        await self._http.aclose()
+        logger.info("Database client closed")
+
+    def stats(self) -> dict[str, int]:
+        """Return query counters and current concurrency."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queries": self.queries,
+            "errors": self.errors,
+        }
@@ -0,0 +1,109 @@
+import time
+from typing import AsyncIterator
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+def _has_codec(codec: str | None) -> bool:
+    return bool(codec) and codec != "none"
+
+
+async def aggregate_formats(rows: AsyncIterator[dict[str, any]]) -> dict[str, any]:
+    """
+    Aggregate cached_formats rows in Python, the fallback of the cache_format_stats RPC.
+
+    Args:
+        rows: Rows ordered by video_id, e.g. from iter_cached_formats, so
+            distinct videos can be counted without remembering them
+
+    Returns:
+        Raw totals with the same keys the RPC returns
+    """
+    totals = {
+        "total_formats": 0,
+        "unique_videos": 0,
+        "total_size_bytes": 0,
+        "audio_files": 0,
+        "audio_size_bytes": 0,
+        "video_files": 0,
+        "video_size_bytes": 0,
+        "format_breakdown": {},
+    }
+    last_video_id = None
+    async for row in rows:
+        CacheStatsCounter.apply(totals, row, 1)
+        if row.get("video_id") != last_video_id:
+            totals["unique_videos"] += 1
+            last_video_id = row.get("video_id")
+    return totals
+
+
+def format_cache_stats(totals: dict[str, any]) -> dict[str, int | float]:
+    """Turn raw totals into the response shape of get_cache_stats."""
+    return {
+        "total_formats": totals["total_formats"],
+        "unique_videos": totals["unique_videos"],
+        "total_audio_files": totals["audio_files"],
+        "total_video_files": totals["video_files"],
+        "total_size_bytes": totals["total_size_bytes"],
+        "total_size_mb": round(totals["total_size_bytes"] / MB, 2),
+        "total_size_gb": round(totals["total_size_bytes"] / GB, 2),
+        "audio_size_mb": round(totals["audio_size_bytes"] / MB, 2),
+        "video_size_mb": round(totals["video_size_bytes"] / MB, 2),
+        "format_breakdown": dict(totals["format_breakdown"]),
+    }
+
+
+class CacheStatsCounter:
+    """
+    In-process running totals of cached_formats, updated on every store and remove.
+
+    Seeded from a full aggregate and re-seeded once older than `resync`
+    seconds, which corrects drift from writes made by other processes.
+    unique_videos is only refreshed by the re-seed, as keeping it exact
+    would mean tracking every video ID.
+    """
+
+    def __init__(self, resync: float = 600) -> None:
+        self.resync = resync
+        self._totals: dict[str, any] | None = None
+        self._seeded_at = 0.0
+
+    @staticmethod
+    def apply(totals: dict[str, any], row: dict[str, any], sign: int) -> None:
+        """Add (sign=1) or subtract (sign=-1) one cached_formats row."""
+        size = (row.get("filesize") or 0) * sign
+        totals["total_formats"] += sign
+        totals["total_size_bytes"] += size
+        if _has_codec(row.get("acodec")):
+            totals["audio_files"] += sign
+            totals["audio_size_bytes"] += size
+        if _has_codec(row.get("vcodec")):
+            totals["video_files"] += sign
+            totals["video_size_bytes"] += size
+        tag = row.get("tag", "unknown")
+        breakdown = totals["format_breakdown"]
+        breakdown[tag] = breakdown.get(tag, 0) + sign
+        if breakdown[tag] <= 0:
+            del breakdown[tag]
+
+    @property
+    def fresh(self) -> bool:
+        return self._totals is not None and time.monotonic() - self._seeded_at < self.resync
+
+    def seed(self, totals: dict[str, any]) -> None:
+        self._totals = {**totals, "format_breakdown": dict(totals["format_breakdown"])}
+        self._seeded_at = time.monotonic()
+
+    def added(self, row: dict[str, any]) -> None:
+        if self._totals is not None:
+            self.apply(self._totals, row, 1)
+
+    def removed(self, row: dict[str, any]) -> None:
+        if self._totals is not None:
+            self.apply(self._totals, row, -1)
+
+    def snapshot(self) -> dict[str, any] | None:
+        """Return the current totals, or None before the first seed."""
+        return self._totals
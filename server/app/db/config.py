@@ -1,10 +1,19 @@
 from supabase import create_client, Client
-from app.config import SUPABASE_URL, SUPABASE_KEY
+from app.config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_DB_MAX_CONNECTIONS, SUPABASE_DB_CONCURRENCY, SUPABASE_DB_TIMEOUT
+from app.db.async_client import AsyncRestClient
 from app.logger import logger
 import traceback
 
 try:
     supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    # Table queries go through the async client, supabase is kept for auth
+    rest = AsyncRestClient(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        max_connections=SUPABASE_DB_MAX_CONNECTIONS,
+        max_concurrency=SUPABASE_DB_CONCURRENCY,
+        timeout=SUPABASE_DB_TIMEOUT,
+    )
     logger.info("✅ Supabase client initialized successfully")
 except Exception as e:
     logger.error(f"❌ Failed to initialize Supabase client: {e}")
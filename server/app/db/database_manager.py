@@ -1,11 +1,29 @@
-from app.db.config import supabase
+from app.db.config import rest
 from app.utils.api_error import ApiError
 from app.logger import logger
 from app.utils.async_handler import async_handler
-from fastapi.concurrency import run_in_threadpool
 from app.utils.api_error import ApiError
 from postgrest.exceptions import APIError
+from app.utils.ttl_cache import TTLCache
+from app.config import (
+    METADATA_CACHE_MAX_ENTRIES, METADATA_CACHE_TTL, CACHE_STATS_INCREMENTAL, CACHE_STATS_RESYNC, CACHED_FORMATS_PAGE_SIZE, PLAN_CATALOG_REFRESH, ACCESS_COUNT_FLUSH_INTERVAL,
+    WRITE_BUFFER_FLUSH_INTERVAL, WRITE_BUFFER_BATCH_ROWS, WRITE_BUFFER_MAX_PENDING,
+    WRITE_BUFFER_RETRY_BASE, WRITE_BUFFER_RETRY_MAX,
+)
+from app.db.plan_catalog import PlanCatalog
+from app.db.access_counter import AccessCounter
+from app.db.write_buffer import WriteBuffer
+from app.db.cache_stats import CacheStatsCounter, aggregate_formats, format_cache_stats
 from datetime import timedelta, datetime
+from typing import AsyncIterator, Awaitable, Callable
+import asyncio
+import copy
+import uuid
+
+def _filter_value(value: str) -> str:
+    """Quote a value for a PostgREST or/and filter, so , . ( ) in it are taken literally."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
 
 class DatabaseManager:
     """
@@ -20,14 +38,49 @@ class DatabaseManager:
     
     def __init__(self) -> None:
         """Initialize database manager with Supabase table references."""
-        self.plans = supabase.table("pricing_plans")
-        self.users = supabase.table("users")
-        self.cached_info = supabase.table("cached_info")
-        self.cached_formats = supabase.table("cached_formats")
-        self.cached_playlist = supabase.table("cached_playlist")
-        self.user_plans = supabase.table("user_plans")
-        self.downloads = supabase.table("downloads")
-        self.payments = supabase.table("payments")
+        self.plans = rest.table("pricing_plans")
+        self.users = rest.table("users")
+        self.cached_info = rest.table("cached_info")
+        self.cached_formats = rest.table("cached_formats")
+        self.cached_playlist = rest.table("cached_playlist")
+        self.cached_playlist_entries = rest.table("cached_playlist_entries")
+        self.user_plans = rest.table("user_plans")
+        self.downloads = rest.table("downloads")
+        self.payments = rest.table("payments")
+        
+        # Pricing plans rarely change, keep the whole table in memory
+        self.plan_catalog = PlanCatalog(rest, refresh_interval=PLAN_CATALOG_REFRESH)
+        
+        # In-process tier in front of the cache tables
+        self._info_cache = TTLCache(max_size=METADATA_CACHE_MAX_ENTRIES, default_ttl=METADATA_CACHE_TTL)
+        self._formats_cache = TTLCache(max_size=METADATA_CACHE_MAX_ENTRIES, default_ttl=METADATA_CACHE_TTL)
+        self._playlist_cache = TTLCache(max_size=METADATA_CACHE_MAX_ENTRIES, default_ttl=METADATA_CACHE_TTL)
+        
+        # Running cached_formats totals, so cache stats don't need a query each time
+        self._stats_counter = CacheStatsCounter(resync=CACHE_STATS_RESYNC) if CACHE_STATS_INCREMENTAL else None
+        self._stats_rpc_available = True
+        
+        # Cache and download log inserts are written behind as bulk upserts
+        self.write_buffer = WriteBuffer(
+            rest,
+            flush_interval=WRITE_BUFFER_FLUSH_INTERVAL,
+            batch_rows=WRITE_BUFFER_BATCH_ROWS,
+            max_pending=WRITE_BUFFER_MAX_PENDING,
+            retry_base=WRITE_BUFFER_RETRY_BASE,
+            retry_max=WRITE_BUFFER_RETRY_MAX,
+        )
+        self.write_buffer.register("cached_info", "video_id")
+        self.write_buffer.register("cached_playlist", "playlist_id")
+        self.write_buffer.register("cached_formats", "video_id,tag")
+        self.write_buffer.register("downloads", "id")
+        
+        # cached_formats access counts, flushed in batches off the request path;
+        # counts of rows not written yet are folded into the queued row
+        self.access_counter = AccessCounter(
+            rest,
+            flush_interval=ACCESS_COUNT_FLUSH_INTERVAL,
+            write_buffer=self.write_buffer,
+        )
         
     async def get_plans(self) -> list[dict[str, any]]:
         """
@@ -40,9 +93,9 @@ class DatabaseManager:
             ApiError: If no plans found or database error occurs
         """
         try:
-            response = await run_in_threadpool(self.plans.select("*").execute)
+            plans = await self.plan_catalog.all()
             
-            if not hasattr(response, 'data') or not response.data:
+            if not plans:
                 logger.warning("No pricing plans found in database")
                 raise ApiError(
                     status_code=404,
@@ -50,9 +103,11 @@ class DatabaseManager:
                     error_code="PLANS_NOT_FOUND"
                 )
             
-            logger.info(f"Retrieved {len(response.data)} pricing plans")
-            return response.data
+            logger.info(f"Retrieved {len(plans)} pricing plans")
+            return plans
             
+        except ApiError:
+            raise
         except APIError as e:
             logger.error(f"Database error while fetching plans: {e}")
             raise ApiError(
@@ -89,11 +144,9 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.plans.select("*").eq("id", plan_id).execute
-            )
+            plan = await self.plan_catalog.get(plan_id)
             
-            if not hasattr(response, 'data') or not response.data:
+            if not plan:
                 logger.warning(f"Plan not found with ID: {plan_id}")
                 raise ApiError(
                     status_code=404, 
@@ -102,7 +155,7 @@ class DatabaseManager:
                 )
                 
             logger.info(f"Retrieved plan with ID: {plan_id}")
-            return response.data[0]
+            return plan
             
         except APIError as e:
             logger.error(f"Database error while fetching plan {plan_id}: {e}")
@@ -141,9 +194,7 @@ class DatabaseManager:
             
         try:
             # Get user plans
-            plan_ids_response = await run_in_threadpool(
-                self.user_plans.select("*").eq("user_id", user_id).execute
-            )
+            plan_ids_response = await rest.execute(self.user_plans.select("*").eq("user_id", user_id))
             
             user_plans = plan_ids_response.data
 
@@ -151,25 +202,19 @@ class DatabaseManager:
                 logger.info(f"No plans found for user: {user_id}")
                 return []
 
+            # Pricing details come from the in-memory catalog
+            catalog = await self.plan_catalog.get_many([plan["plan_id"] for plan in user_plans])
+
             full_plans = []
             for plan in user_plans:
-                try:
-                    plans_response = await run_in_threadpool(
-                        self.plans.select("*").eq("id", plan['plan_id']).execute
-                    )
-                    
-                    if not plans_response.data:
-                        logger.warning(f"Plan with ID {plan['plan_id']} not found for user {user_id}")
-                        continue
-                        
-                    plan_info = plans_response.data[0].copy()
-                    plan_info.pop("id", None)  # Remove plan id to avoid conflicts
-                    merged_info = {**plan, **plan_info}
-                    full_plans.append(merged_info)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing plan {plan['plan_id']} for user {user_id}: {e}")
+                plan_info = catalog.get(plan["plan_id"])
+                if not plan_info:
+                    logger.warning(f"Plan with ID {plan['plan_id']} not found for user {user_id}")
                     continue
+                    
+                plan_info.pop("id", None)  # Remove plan id to avoid conflicts
+                merged_info = {**plan, **plan_info}
+                full_plans.append(merged_info)
 
             logger.info(f"Retrieved {len(full_plans)} plans for user: {user_id}")
             return full_plans
@@ -211,9 +256,7 @@ class DatabaseManager:
             
         try:
             # Get user plan
-            response = await run_in_threadpool(
-                self.user_plans.select("*").eq("id", user_plan_id).execute
-            )
+            response = await rest.execute(self.user_plans.select("*").eq("id", user_plan_id))
             
             if not response.data:
                 logger.warning(f"User plan not found with ID: {user_plan_id}")
@@ -226,11 +269,9 @@ class DatabaseManager:
             user_plan = response.data[0]
             
             # Fetch additional plan data
-            plan_response = await run_in_threadpool(
-                self.plans.select("*").eq("id", user_plan["plan_id"]).execute
-            )
+            plan = await self.plan_catalog.get(user_plan["plan_id"])
             
-            if not plan_response.data:
+            if not plan:
                 logger.warning(f"Associated plan not found for user plan {user_plan_id}")
                 raise ApiError(
                     status_code=404, 
@@ -239,7 +280,6 @@ class DatabaseManager:
                 )
 
             # Merge user plan data with plan data
-            plan = plan_response.data[0]
             plan.pop("id")
             merged_plan = {**user_plan, **plan}
             
@@ -310,9 +350,7 @@ class DatabaseManager:
                 "requests_made": 0  # Initialize requests counter
             }
             
-            response = await run_in_threadpool(
-                self.user_plans.insert(user_plan_data).execute
-            )
+            response = await rest.execute(self.user_plans.insert(user_plan_data))
             
             if not response.data:
                 raise ApiError(
@@ -363,9 +401,7 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.user_plans.delete().eq("id", plan_id).execute
-            )
+            response = await rest.execute(self.user_plans.delete().eq("id", plan_id))
             
             if not response.data:
                 logger.warning(f"User plan not found for user {user_id} and plan {plan_id}")
@@ -376,9 +412,9 @@ class DatabaseManager:
                 )
                 
             #fetch full plan details
-            plan = await self.plans.get(plan_id)
+            plan = await self.plan_catalog.get(response.data[0]["plan_id"])
             if not plan:
-                logger.warning(f"Plan not found: {plan_id}")
+                logger.warning(f"Plan not found: {response.data[0]['plan_id']}")
                 raise ApiError(
                     status_code=404,
                     message="Plan not found",
@@ -426,47 +462,46 @@ class DatabaseManager:
                 error_code="INVALID_VIDEO_ID"
             )
             
-        try:
-            response = await run_in_threadpool(
-                self.cached_info.select("*").eq("video_id", video_id).execute
-            )
+        async def load_info() -> dict[str, any] | None:
+            video_row = self._info_cache.get(video_id)
+            if video_row is None:
+                response = await rest.execute(self.cached_info.select("*").eq("video_id", video_id))
+                if not response.data:
+                    return None
+                video_row = response.data[0]
+                self._info_cache.set(video_id, video_row)
+            return video_row
 
-            if not response.data:
+        async def load_formats() -> list[dict[str, any]]:
+            try:
+                cached_formats = self._formats_cache.get(video_id)
+                if cached_formats is None:
+                    formats_response = await rest.execute(self.cached_formats.select("*").eq("video_id", video_id))
+                    cached_formats = formats_response.data or []
+                    self._formats_cache.set(video_id, cached_formats)
+                return cached_formats
+            except Exception as format_error:
+                logger.warning(f"Error checking cached formats for video {video_id}: {format_error}")
+                # Continue without cached format information
+                return []
+
+        try:
+            # Both lookups in one round-trip
+            video_row, cached_formats = await asyncio.gather(load_info(), load_formats())
+            if video_row is None:
                 logger.debug(f"No cached video info found for video: {video_id}")
                 return None
 
-            video_info = response.data[0].copy()
+            # Callers get their own copy, the cached row is never marked
+            video_info = copy.deepcopy(video_row)
 
-            # Initialize cached status for all qualities
+            # Mark cached qualities
+            cached_tags = {f.get("tag") for f in cached_formats}
             for quality in video_info.get("video_qualities", []):
-                quality["is_cached"] = False
+                quality["is_cached"] = f"video_{quality.get('format', '')}" in cached_tags
 
             for quality in video_info.get("audio_qualities", []):
-                quality["is_cached"] = False
-
-            # Check for cached formats
-            try:
-                formats_response = await run_in_threadpool(
-                    self.cached_formats.select("*").eq("video_id", video_id).execute
-                )
-
-                if formats_response.data:
-                    cached_formats = formats_response.data
-
-                    # Update cached status based on available formats
-                    for quality in video_info.get("video_qualities", []):
-                        quality_tag = f"video_{quality.get('format', '')}"
-                        if any(f.get("tag") == quality_tag for f in cached_formats):
-                            quality["is_cached"] = True
-
-                    for quality in video_info.get("audio_qualities", []):
-                        quality_tag = f"audio_{quality.get('format', '')}"
-                        if any(f.get("tag") == quality_tag for f in cached_formats):
-                            quality["is_cached"] = True
-
-            except Exception as format_error:
-                logger.warning(f"Error checking cached formats for video {video_id}: {format_error}")
-                # Continue without cached format information
+                quality["is_cached"] = f"audio_{quality.get('format', '')}" in cached_tags
 
             logger.debug(f"Retrieved cached video info for: {video_id}")
             return video_info
@@ -490,6 +525,8 @@ class DatabaseManager:
         """
         Store video information in the cache.
         
+        The row is served from memory at once and written by write_buffer.
+        
         Args:
             video_info: dictionary containing video metadata
             
@@ -514,19 +551,10 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.cached_info.insert(video_info).execute
-            )
-            
-            if not response.data:
-                raise ApiError(
-                    status_code=500,
-                    message="Failed to store video information",
-                    error_code="STORAGE_FAILED"
-                )
-                
+            await self.write_buffer.put("cached_info", video_info)
+            self._info_cache.set(video_info["video_id"], video_info)
             logger.info(f"Stored video info for video: {video_info['video_id']}")
-            return response.data
+            return [video_info]
             
         except APIError as e:
             logger.error(f"Database error while storing video info: {e}")
@@ -545,7 +573,10 @@ class DatabaseManager:
             
     async def get_cached_format(self, video_id: str, tag: str) -> dict[str, any]:
         """
-        Retrieve a specific cached format and increment access count.
+        Retrieve a specific cached format and record an access to it.
+        
+        The access is buffered by access_counter and reaches access_count
+        on its next flush, so a cache hit costs a single query.
         
         Args:
             video_id: YouTube video ID
@@ -572,28 +603,20 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.cached_formats.select("*").eq("video_id", video_id).eq("tag", tag).execute
-            )
+            # Stored but not yet written
+            cached_format = self.write_buffer.get("cached_formats", (video_id, tag))
+            if cached_format is not None:
+                self.access_counter.record(video_id, tag)
+                return cached_format
+            
+            response = await rest.execute(self.cached_formats.select("*").eq("video_id", video_id).eq("tag", tag))
             
             if not response.data:
                 logger.debug(f"No cached format found for video {video_id} with tag {tag}")
                 return None
                 
             cached_format = response.data[0]
-            
-            # Increment access count asynchronously
-            try:
-                current_count = cached_format.get("access_count", 0)
-                await run_in_threadpool(
-                    self.cached_formats.update({
-                        "access_count": current_count + 1
-                    }).eq("video_id", video_id).eq("tag", tag).execute
-                )
-                logger.debug(f"Incremented access count for format {tag} of video {video_id}")
-            except Exception as count_error:
-                logger.warning(f"Failed to increment access count for {video_id}/{tag}: {count_error}")
-                # Continue without failing the main operation
+            self.access_counter.record(video_id, tag)
             
             logger.debug(f"Retrieved cached format {tag} for video {video_id}")
             return cached_format
@@ -617,6 +640,8 @@ class DatabaseManager:
         """
         Store cached format information.
         
+        The row is written by write_buffer; get_cached_format sees it at once.
+        
         Args:
             format_info: dictionary containing format metadata
             
@@ -649,19 +674,16 @@ class DatabaseManager:
                 "access_count": 0
             }
             
-            response = await run_in_threadpool(
-                self.cached_formats.insert(format_info_with_metadata).execute
-            )
-            
-            if not response.data:
-                raise ApiError(
-                    status_code=500,
-                    message="Failed to store cached format",
-                    error_code="STORAGE_FAILED"
-                )
+            await self.write_buffer.put("cached_formats", format_info_with_metadata)
                 
+            cached_formats = self._formats_cache.peek(format_info["video_id"])
+            if cached_formats is not None:
+                self._formats_cache.set(format_info["video_id"], [*cached_formats, format_info_with_metadata])
+            if self._stats_counter:
+                self._stats_counter.added(format_info_with_metadata)
+
             logger.info(f"Stored cached format {format_info['tag']} for video {format_info['video_id']}")
-            return response.data
+            return [format_info_with_metadata]
             
         except APIError as e:
             logger.error(f"Database error while storing cached format: {e}")
@@ -707,9 +729,13 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.cached_formats.delete().eq("video_id", video_id).eq("tag", tag).execute
-            )
+            response = await rest.execute(self.cached_formats.delete().eq("video_id", video_id).eq("tag", tag))
+            await self.write_buffer.discard("cached_formats", (video_id, tag))
+            self._formats_cache.delete(video_id)
+            self.access_counter.discard(video_id, tag)
+            if self._stats_counter:
+                for row in response.data or []:
+                    self._stats_counter.removed(row)
             
             if not response.data:
                 logger.warning(f"Cached format not found for video {video_id} with tag {tag}")
@@ -729,6 +755,8 @@ class DatabaseManager:
                 message=f"Database error: {str(e)}", 
                 error_code="DATABASE_ERROR"
             )
+        except ApiError:
+            raise
         except Exception as e:
             logger.error(f"Unexpected error while removing cached format {video_id}/{tag}: {e}")
             raise ApiError(
@@ -758,14 +786,17 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.cached_playlist.select("*").eq("playlist_id", playlist_id).execute
-            )
+            playlist = self._playlist_cache.get(playlist_id)
+            if playlist is not None:
+                return playlist
+
+            response = await rest.execute(self.cached_playlist.select("*").eq("playlist_id", playlist_id))
             
             if not response.data:
                 logger.debug(f"No cached playlist info found for: {playlist_id}")
                 return None
                 
+            self._playlist_cache.set(playlist_id, response.data[0])
             logger.debug(f"Retrieved cached playlist info for: {playlist_id}")
             return response.data[0]
             
@@ -788,6 +819,8 @@ class DatabaseManager:
         """
         Store playlist information in the cache.
         
+        The row is served from memory at once and written by write_buffer.
+        
         Args:
             playlist_info: dictionary containing playlist metadata
             
@@ -812,19 +845,10 @@ class DatabaseManager:
             )
             
         try:
-            response = await run_in_threadpool(
-                self.cached_playlist.insert(playlist_info).execute
-            )
-            
-            if not response.data:
-                raise ApiError(
-                    status_code=500,
-                    message="Failed to store playlist information",
-                    error_code="STORAGE_FAILED"
-                )
-                
+            await self.write_buffer.put("cached_playlist", playlist_info)
+            self._playlist_cache.set(playlist_info["playlist_id"], playlist_info)
             logger.info(f"Stored playlist info for: {playlist_info['playlist_id']}")
-            return response.data
+            return [playlist_info]
             
         except APIError as e:
             logger.error(f"Database error while storing playlist info: {e}")
@@ -841,44 +865,349 @@ class DatabaseManager:
                 error_code="UNEXPECTED_ERROR"
             )
         
-    async def get_all_cached_videos(self) -> list[dict[str, any]]:
+    async def get_playlist_entries(self, playlist_id: str, offset: int, limit: int) -> list[dict[str, any]]:
         """
-        Retrieve all cached video formats.
+        Retrieve a page of cached playlist entries.
         
+        Args:
+            playlist_id: YouTube playlist ID
+            offset: Playlist position (0-based) of the first entry
+            limit: Number of positions to return
+            
         Returns:
-            list of all cached video format dictionaries
+            list of entries ordered by position; unavailable videos leave gaps
             
         Raises:
             ApiError: If database error occurs
         """
         try:
-            response = await run_in_threadpool(
-                self.cached_formats.select("*").execute
+            response = await rest.execute(
+                self.cached_playlist_entries.select("*")
+                .eq("playlist_id", playlist_id)
+                .gte("position", offset)
+                .lt("position", offset + limit)
+                .order("position")
+            )
+            return response.data or []
+            
+        except APIError as e:
+            logger.error(f"Database error while fetching entries of playlist {playlist_id}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Database error: {str(e)}", 
+                error_code="DATABASE_ERROR"
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error while fetching entries of playlist {playlist_id}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Unexpected error: {str(e)}", 
+                error_code="UNEXPECTED_ERROR"
             )
+        
+    async def store_playlist_entries(self, entries: list[dict[str, any]]) -> None:
+        """
+        Store a window of playlist entries with one bulk upsert.
+        
+        Written directly rather than through write_buffer, so a page is
+        readable as soon as this returns.
+        
+        Args:
+            entries: Entry rows, each with playlist_id and position
             
-            cached_videos = response.data if response.data else []
-            logger.debug(f"Retrieved {len(cached_videos)} cached video formats")
-            return cached_videos
+        Raises:
+            ApiError: If database error occurs
+        """
+        if not entries:
+            return
+        try:
+            await rest.execute(self.cached_playlist_entries.upsert(entries, on_conflict="playlist_id,position"))
+            logger.debug(f"Stored {len(entries)} entries of playlist {entries[0]['playlist_id']}")
             
         except APIError as e:
-            logger.error(f"Database error while fetching all cached videos: {e}")
+            logger.error(f"Database error while storing playlist entries: {e}")
             raise ApiError(
                 status_code=500, 
                 message=f"Database error: {str(e)}", 
                 error_code="DATABASE_ERROR"
             )
         except Exception as e:
-            logger.error(f"Unexpected error while fetching all cached videos: {e}")
+            logger.error(f"Unexpected error while storing playlist entries: {e}")
             raise ApiError(
                 status_code=500, 
                 message=f"Unexpected error: {str(e)}", 
                 error_code="UNEXPECTED_ERROR"
             )
         
-    async def get_cache_stats(self) -> dict[str, int|float]:
+    async def store_download_request(
+        self,
+        user_id: str,
+        user_plan_id: str,
+        source_url: str,
+        video_id: str,
+        thumbnail_url: str | None,
+        title: str | None,
+        video_quality: str | None,
+        audio_quality: str | None,
+        subtitles: bool,
+        ip: str,
+        fingerprint: str
+    ) -> dict[str, any]:
+        """
+        Record a download request.
+        
+        The row gets its ID here and is written by write_buffer, so the
+        request does not wait for the insert.
+        
+        Args:
+            user_id: ID of the requesting user
+            user_plan_id: User plan the download is charged to
+            source_url: YouTube URL being downloaded
+            video_id: YouTube video ID
+            thumbnail_url: Video thumbnail URL
+            title: Video title
+            video_quality: Requested video quality, None for audio downloads
+            audio_quality: Requested audio quality, None for video downloads
+            subtitles: Whether subtitles were requested
+            ip: Client IP address
+            fingerprint: Client fingerprint
+            
+        Returns:
+            dictionary containing the stored download row
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        try:
+            download = {
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "user_plan_id": user_plan_id,
+                "source_url": source_url,
+                "video_id": video_id,
+                "thumbnail_url": thumbnail_url,
+                "title": title,
+                "video_quality": video_quality,
+                "audio_quality": audio_quality,
+                "subtitles": subtitles,
+                "ip": ip,
+                "fingerprint": fingerprint,
+                "status": "queued"
+            }
+            await self.write_buffer.put("downloads", download)
+                
+            logger.info(f"Stored download request for video {video_id} by user {user_id}")
+            return download
+            
+        except APIError as e:
+            logger.error(f"Database error while storing download request: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Database error: {str(e)}", 
+                error_code="DATABASE_ERROR"
+            )
+        except ApiError:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error while storing download request: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Unexpected error: {str(e)}", 
+                error_code="UNEXPECTED_ERROR"
+            )
+        
+    async def store_download_completion(self, download_id: str) -> list[dict[str, any]]:
+        """
+        Mark a download request as completed.
+        
+        Args:
+            download_id: ID of the download row
+            
+        Returns:
+            list containing the updated download row
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        return await self._update_download(download_id, {
+            "status": "completed",
+            "completed_at": datetime.utcnow().isoformat()
+        })
+        
+    async def store_download_error(self, download_id: str, error: str) -> list[dict[str, any]]:
+        """
+        Mark a download request as failed.
+        
+        Args:
+            download_id: ID of the download row
+            error: Error message to record
+            
+        Returns:
+            list containing the updated download row
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        return await self._update_download(download_id, {
+            "status": "failed",
+            "error": error
+        })
+        
+    async def _update_download(self, download_id: str, fields: dict[str, any]) -> list[dict[str, any]]:
+        key = (download_id,)
+        while True:
+            # Still queued: fold the update into the pending insert
+            if self.write_buffer.merge("downloads", key, fields):
+                logger.debug(f"Updated queued download {download_id}: {fields['status']}")
+                return [self.write_buffer.get("downloads", key)]
+            if not self.write_buffer.writing("downloads", key):
+                break
+            # Being written right now, a failed write puts it back in the queue
+            await self.write_buffer.wait_written("downloads", key)
+            
+        try:
+            response = await rest.execute(self.downloads.update(fields).eq("id", download_id))
+            if not response.data and self.write_buffer.merge("downloads", key, fields):
+                # The update matched no row because the insert is queued again
+                logger.debug(f"Updated queued download {download_id}: {fields['status']}")
+                return [self.write_buffer.get("downloads", key)]
+            logger.debug(f"Updated download {download_id}: {fields['status']}")
+            return response.data
+            
+        except APIError as e:
+            logger.error(f"Database error while updating download {download_id}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Database error: {str(e)}", 
+                error_code="DATABASE_ERROR"
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error while updating download {download_id}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Unexpected error: {str(e)}", 
+                error_code="UNEXPECTED_ERROR"
+            )
+        
+    def get_metadata_cache_stats(self) -> dict[str, dict[str, int | float]]:
+        """
+        Get hit ratios of the in-process metadata tier.
+        
+        Returns:
+            dictionary of cache counters keyed by table
+        """
+        return {
+            "cached_info": self._info_cache.stats(),
+            "cached_formats": self._formats_cache.stats(),
+            "cached_playlist": self._playlist_cache.stats(),
+        }
+        
+    async def get_cached_formats_page(
+        self,
+        after: tuple[str, str] | None = None,
+        limit: int = 500,
+        columns: str = "*"
+    ) -> list[dict[str, any]]:
+        """
+        Retrieve one page of cached formats, ordered by (video_id, tag).
+        
+        Keyset pagination: the next page starts strictly after the last
+        (video_id, tag) seen, so every page costs the same however deep it is
+        and no rows are skipped or repeated while the table changes.
+        
+        Args:
+            after: (video_id, tag) of the last row of the previous page, None for the first page
+            limit: Maximum rows to return
+            columns: Columns to select, must include video_id and tag
+            
+        Returns:
+            list of cached format dictionaries, shorter than limit on the last page
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        if limit <= 0:
+            raise ApiError(
+                status_code=400,
+                message="Limit must be positive",
+                error_code="INVALID_LIMIT"
+            )
+            
+        try:
+            query = self.cached_formats.select(columns)
+            if after:
+                video_id, tag = _filter_value(after[0]), _filter_value(after[1])
+                query = query.or_(f"video_id.gt.{video_id},and(video_id.eq.{video_id},tag.gt.{tag})")
+            response = await rest.execute(query.order("video_id").order("tag").limit(limit))
+            return response.data or []
+            
+        except APIError as e:
+            logger.error(f"Database error while paging cached formats after {after}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Database error: {str(e)}", 
+                error_code="DATABASE_ERROR"
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error while paging cached formats after {after}: {e}")
+            raise ApiError(
+                status_code=500, 
+                message=f"Unexpected error: {str(e)}", 
+                error_code="UNEXPECTED_ERROR"
+            )
+        
+    async def iter_cached_formats(self, page_size: int = CACHED_FORMATS_PAGE_SIZE, columns: str = "*") -> AsyncIterator[dict[str, any]]:
+        """
+        Stream every cached format, one page in memory at a time.
+        
+        Args:
+            page_size: Rows fetched per request
+            columns: Columns to select, must include video_id and tag
+            
+        Yields:
+            cached format dictionaries ordered by (video_id, tag)
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        after = None
+        while True:
+            page = await self.get_cached_formats_page(after, page_size, columns)
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            after = (page[-1]["video_id"], page[-1]["tag"])
+        
+    async def get_all_cached_videos(self) -> list[dict[str, any]]:
+        """
+        Retrieve all cached video formats.
+        
+        Pages through the table, so unlike a single select the result is
+        not truncated by the PostgREST row cap. Prefer iter_cached_formats
+        when the rows can be processed as they arrive.
+        
+        Returns:
+            list of all cached video format dictionaries
+            
+        Raises:
+            ApiError: If database error occurs
+        """
+        cached_videos = [row async for row in self.iter_cached_formats()]
+        logger.debug(f"Retrieved {len(cached_videos)} cached video formats")
+        return cached_videos
+        
+    async def get_cache_stats(self, fresh: bool = False) -> dict[str, int|float]:
         """
         Get comprehensive cache statistics.
         
+        Served from the in-process counter while it is fresh; otherwise
+        aggregated by the cache_format_stats RPC (see sql/cache_stats.sql),
+        or in Python from every row if the function is not installed.
+        
+        Args:
+            fresh: Bypass the in-process counter and aggregate again
+        
         Returns:
             dictionary containing cache statistics including counts and sizes
             
@@ -886,55 +1215,33 @@ class DatabaseManager:
             ApiError: If database error occurs
         """
         try:
-            videos = await self.get_all_cached_videos()
-
-            stats = {
-                "total_formats": len(videos),
-                "total_size_bytes": 0,
-                "audio_files": {"count": 0, "size_bytes": 0},
-                "video_files": {"count": 0, "size_bytes": 0},
-                "unique_videos": set(),
-                "format_types": {}
-            }
+            if self._stats_counter and self._stats_counter.fresh and not fresh:
+                return format_cache_stats(self._stats_counter.snapshot())
             
-            for video in videos:
-                file_size = video.get("filesize", 0)
-                stats["total_size_bytes"] += file_size
-                
-                # Track unique videos
-                if video.get("video_id"):
-                    stats["unique_videos"].add(video["video_id"])
-                
-                # Categorize by codec
-                if video.get("acodec") and video.get("acodec") != "none":
-                    stats["audio_files"]["count"] += 1
-                    stats["audio_files"]["size_bytes"] += file_size
-                    
-                if video.get("vcodec") and video.get("vcodec") != "none":
-                    stats["video_files"]["count"] += 1
-                    stats["video_files"]["size_bytes"] += file_size
-                
-                # Track format types
-                tag = video.get("tag", "unknown")
-                stats["format_types"][tag] = stats["format_types"].get(tag, 0) + 1
-
-            # Convert to final format
-            result = {
-                "total_formats": stats["total_formats"],
-                "unique_videos": len(stats["unique_videos"]),
-                "total_audio_files": stats["audio_files"]["count"],
-                "total_video_files": stats["video_files"]["count"],
-                "total_size_bytes": stats["total_size_bytes"],
-                "total_size_mb": round(stats["total_size_bytes"] / (1024 * 1024), 2),
-                "total_size_gb": round(stats["total_size_bytes"] / (1024 * 1024 * 1024), 2),
-                "audio_size_mb": round(stats["audio_files"]["size_bytes"] / (1024 * 1024), 2),
-                "video_size_mb": round(stats["video_files"]["size_bytes"] / (1024 * 1024), 2),
-                "format_breakdown": stats["format_types"]
-            }
+            totals = None
+            if self._stats_rpc_available:
+                try:
+                    response = await rest.execute(rest.rpc("cache_format_stats"))
+                    totals = response.data
+                except APIError as e:
+                    # Function not installed: fall back for the rest of this process's life
+                    logger.warning(f"cache_format_stats RPC unavailable, aggregating in Python: {e}")
+                    self._stats_rpc_available = False
+            
+            if totals is None:
+                totals = await aggregate_formats(
+                    self.iter_cached_formats(columns="video_id,tag,filesize,acodec,vcodec")
+                )
             
+            if self._stats_counter:
+                self._stats_counter.seed(totals)
+            
+            result = format_cache_stats(totals)
             logger.info(f"Generated cache stats: {result['unique_videos']} videos, {result['total_size_gb']}GB")
             return result
             
+        except ApiError:
+            raise
         except Exception as e:
             logger.error(f"Unexpected error while generating cache stats: {e}")
             raise ApiError(
@@ -943,12 +1250,27 @@ class DatabaseManager:
                 error_code="UNEXPECTED_ERROR"
             )
 
-    async def cleanup_expired_cache(self, days_old: int = 30) -> dict[str, int]:
+    async def cleanup_expired_cache(
+        self,
+        days_old: int = 30,
+        batch_size: int = 200,
+        batch_pause: float = 0.0,
+        on_formats_deleted: Callable[[list[dict[str, any]]], Awaitable[None]] | None = None
+    ) -> dict[str, int]:
         """
         Clean up cache entries older than specified days.
         
+        Rows are filtered by created_at on the server and deleted in batches
+        of at most batch_size, so only the keys of expired rows are
+        transferred and no single request locks a large range.
+        
         Args:
             days_old: Number of days after which cache entries are considered expired
+            batch_size: Maximum rows selected and deleted per request
+            batch_pause: Seconds to sleep between batches, to rate limit the sweep
+            on_formats_deleted: Coroutine function called with each batch of
+                deleted cached_formats rows (video_id, tag, path, filesize),
+                e.g. to remove the files
             
         Returns:
             dictionary containing cleanup statistics
@@ -963,33 +1285,78 @@ class DatabaseManager:
                 error_code="INVALID_DAYS"
             )
             
-        try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            cutoff_iso = cutoff_date.isoformat()
-            
-            # Count items to be deleted by created_at or similar timestamp column
-            # Note: Adjust column names based on your actual schema
-            expired_formats = await run_in_threadpool(
-                self.cached_formats.select("*").execute
-            )
-            
-            expired_videos = await run_in_threadpool(
-                self.cached_info.select("*").execute
+        if batch_size <= 0:
+            raise ApiError(
+                status_code=400,
+                message="Batch size must be positive",
+                error_code="INVALID_BATCH_SIZE"
             )
             
-            expired_playlists = await run_in_threadpool(
-                self.cached_playlist.select("*").execute
-            )
+        try:
+            cutoff_iso = (datetime.utcnow() - timedelta(days=days_old)).isoformat()
+            
+            async def sweep(table, columns: str, delete_batch) -> int:
+                deleted = 0
+                while True:
+                    response = await rest.execute(table.select(columns).lt("created_at", cutoff_iso).limit(batch_size))
+                    rows = response.data or []
+                    if not rows:
+                        return deleted
+                    removed = await delete_batch(rows)
+                    if removed == 0:
+                        # Selected but not deletable (e.g. row level security), selecting again would loop
+                        logger.warning(f"Cache cleanup could not delete {len(rows)} expired rows, stopping")
+                        return deleted
+                    deleted += removed
+                    if len(rows) < batch_size:
+                        return deleted
+                    if batch_pause > 0:
+                        await asyncio.sleep(batch_pause)
+            
+            async def delete_formats(rows: list[dict[str, any]]) -> int:
+                # Filter by video_id and the same cutoff rather than per-row keys, which
+                # would make the URL too long; the deleted rows come back to be handled
+                video_ids = list({row["video_id"] for row in rows})
+                response = await rest.execute(
+                    self.cached_formats.delete().in_("video_id", video_ids).lt("created_at", cutoff_iso)
+                )
+                rows = response.data or []
+                for video_id in {row["video_id"] for row in rows}:
+                    self._formats_cache.delete(video_id)
+                if self._stats_counter:
+                    for row in rows:
+                        self._stats_counter.removed(row)
+                if on_formats_deleted and rows:
+                    await on_formats_deleted(rows)
+                return len(rows)
+            
+            async def delete_videos(rows: list[dict[str, any]]) -> int:
+                video_ids = [row["video_id"] for row in rows]
+                response = await rest.execute(self.cached_info.delete().in_("video_id", video_ids))
+                for video_id in video_ids:
+                    self._info_cache.delete(video_id)
+                return len(response.data or [])
+            
+            async def delete_playlists(rows: list[dict[str, any]]) -> int:
+                playlist_ids = [row["playlist_id"] for row in rows]
+                response = await rest.execute(self.cached_playlist.delete().in_("playlist_id", playlist_ids))
+                await rest.execute(self.cached_playlist_entries.delete().in_("playlist_id", playlist_ids))
+                for playlist_id in playlist_ids:
+                    self._playlist_cache.delete(playlist_id)
+                return len(response.data or [])
+            
+            expired_formats = await sweep(self.cached_formats, "video_id,tag,path,filesize,acodec,vcodec", delete_formats)
+            expired_videos = await sweep(self.cached_info, "video_id", delete_videos)
+            expired_playlists = await sweep(self.cached_playlist, "playlist_id", delete_playlists)
             
-            # For now, return empty stats since we need to check actual schema
             stats = {
-                "expired_formats": 0,
-                "expired_videos": 0,
-                "expired_playlists": 0,
-                "total_cleaned": 0
+                "expired_formats": expired_formats,
+                "expired_videos": expired_videos,
+                "expired_playlists": expired_playlists,
+                "total_cleaned": expired_formats + expired_videos + expired_playlists
             }
             
-            logger.info(f"Cache cleanup temporarily disabled - needs schema verification for timestamp columns")
+            logger.info(f"Cache cleanup removed {stats['total_cleaned']} entries older than {days_old} days")
             return stats
             
         except APIError as e:
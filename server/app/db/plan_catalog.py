@@ -0,0 +1,163 @@
+import asyncio
+import time
+from app.config import SUPABASE_URL, SUPABASE_KEY
+from app.logger import logger
+
+
+class PlanCatalog:
+    """
+    In-memory copy of the whole pricing_plans table.
+
+    Loaded once at startup and indexed by plan ID and by quality tier
+    (max_video_quality), so plan lookups are dict accesses. The copy is
+    reloaded every `refresh_interval` seconds and, when realtime is
+    enabled, as soon as Supabase reports a change to the table. A lookup
+    for an unknown ID triggers an early reload, rate limited by
+    `min_reload_interval`, so newly added plans are picked up.
+    """
+
+    def __init__(self, client, table: str = "pricing_plans", refresh_interval: float = 300, min_reload_interval: float = 10) -> None:
+        self._client = client
+        self._table = table
+        self.refresh_interval = refresh_interval
+        self.min_reload_interval = min_reload_interval
+        self._by_id: dict[str, dict[str, any]] = {}
+        self._by_tier: dict[str, list[dict[str, any]]] = {}
+        self._loaded_at: float | None = None
+        self._load_lock = asyncio.Lock()
+        self._refresher: asyncio.Task | None = None
+        self._realtime = None
+        self._reload_task: asyncio.Task | None = None
+        self.loads = 0
+        self.lookups = 0
+        self.misses = 0
+
+    async def load(self) -> None:
+        """Fetch every plan and swap in fresh indexes."""
+        async with self._load_lock:
+            response = await self._client.execute(self._client.table(self._table).select("*"))
+            plans = response.data or []
+
+            by_tier: dict[str, list[dict[str, any]]] = {}
+            for plan in plans:
+                by_tier.setdefault(plan.get("max_video_quality"), []).append(plan)
+
+            self._by_id = {plan["id"]: plan for plan in plans}
+            self._by_tier = by_tier
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+            logger.info(f"Plan catalog loaded {len(plans)} plans")
+
+    async def start(self, realtime: bool = False) -> None:
+        """
+        Load the catalog and keep it fresh.
+
+        Args:
+            realtime: Also reload on Supabase realtime change events for pricing_plans
+        """
+        try:
+            await self.load()
+        except Exception as e:
+            # Not fatal: the first lookup loads it again
+            logger.warning(f"Initial plan catalog load failed: {e}")
+        if self.refresh_interval > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+        if realtime:
+            await self._subscribe()
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning(f"Plan catalog refresh failed, keeping the current copy: {e}")
+
+    async def _subscribe(self) -> None:
+        try:
+            from supabase import acreate_client
+
+            client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+            channel = client.channel("pricing-plans")
+            channel.on_postgres_changes(
+                "*",
+                schema="public",
+                table="pricing_plans",
+                callback=lambda payload: self._schedule_reload(),
+            )
+            await channel.subscribe()
+            self._realtime = client
+            logger.info("Plan catalog subscribed to pricing_plans changes")
+        except Exception as e:
+            logger.warning(f"Plan catalog realtime subscription failed, relying on the refresh timer: {e}")
+
+    def _schedule_reload(self) -> None:
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_quietly())
+
+    async def _reload_quietly(self) -> None:
+        try:
+            await self.load()
+        except Exception as e:
+            logger.warning(f"Plan catalog reload failed: {e}")
+
+    async def stop(self) -> None:
+        """Stop the refresh timer and the realtime subscription."""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+        if self._realtime is not None:
+            await self._realtime.remove_all_channels()
+            self._realtime = None
+
+    async def _ensure_loaded(self, plan_ids) -> None:
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.min_reload_interval
+        if stale and any(plan_id not in self._by_id for plan_id in plan_ids):
+            await self.load()
+
+    async def get_many(self, plan_ids: list[str]) -> dict[str, dict[str, any]]:
+        """
+        Look up several plans.
+
+        Args:
+            plan_ids: Pricing plan IDs, duplicates allowed
+
+        Returns:
+            dictionary of plan ID to a copy of the plan row; unknown IDs are left out
+        """
+        self.lookups += 1
+        if any(plan_id not in self._by_id for plan_id in plan_ids):
+            self.misses += 1
+            await self._ensure_loaded(plan_ids)
+        return {plan_id: dict(self._by_id[plan_id]) for plan_id in plan_ids if plan_id in self._by_id}
+
+    async def get(self, plan_id: str) -> dict[str, any] | None:
+        """Look up one plan, returning a copy or None if it does not exist."""
+        return (await self.get_many([plan_id])).get(plan_id)
+
+    async def all(self) -> list[dict[str, any]]:
+        """Return copies of every plan."""
+        if self._loaded_at is None:
+            await self.load()
+        return [dict(plan) for plan in self._by_id.values()]
+
+    def by_tier(self, max_video_quality: str) -> list[dict[str, any]]:
+        """Return copies of the plans whose max_video_quality is the given tier."""
+        return [dict(plan) for plan in self._by_tier.get(max_video_quality, [])]
+
+    def invalidate(self) -> None:
+        """Force the next lookup of an unknown plan to reload immediately."""
+        self._loaded_at = None
+
+    def stats(self) -> dict[str, int | float | bool | None]:
+        """Return catalog size, load and lookup counters."""
+        return {
+            "plans": len(self._by_id),
+            "tiers": len(self._by_tier),
+            "loads": self.loads,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+            "realtime": self._realtime is not None,
+        }
@@ -0,0 +1,304 @@
+import asyncio
+import time
+from postgrest.exceptions import APIError
+from app.logger import logger
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer that turns single-row inserts into bulk upserts.
+
+    Rows are queued per table and keyed by the table's conflict columns, so
+    a later write of the same key is merged into the queued row instead of
+    adding another. The queue is flushed every `flush_interval` seconds, or
+    as soon as `batch_rows` rows are waiting, with one upsert per table and
+    batch. At most `max_pending` rows are held; writers wait for the next
+    flush beyond that. A batch that fails stays queued and its table is
+    retried with exponential backoff, from `retry_base` up to `retry_max`
+    seconds, for as long as the database is unreachable. After
+    `max_attempts` a batch the database rejected is split down to single
+    rows, and only the rows that fail on their own are dropped.
+
+    Until start() is called every write is flushed before it returns.
+    """
+
+    def __init__(
+        self,
+        client,
+        flush_interval: float = 0.2,
+        batch_rows: int = 100,
+        max_pending: int = 5000,
+        max_attempts: int = 3,
+        retry_base: float = 0.5,
+        retry_max: float = 30.0,
+    ) -> None:
+        if batch_rows <= 0 or max_pending < batch_rows:
+            raise ValueError("Expected 0 < batch_rows <= max_pending")
+
+        self._client = client
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._conflict: dict[str, tuple[str, ...]] = {}
+        self._pending: dict[str, dict[tuple, dict[str, any]]] = {}
+        self._attempts: dict[str, int] = {}
+        self._retry_at: dict[str, float] = {}
+        self._in_flight: set[tuple[str, tuple]] = set()
+        self._size = 0
+        self._flush_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._stopping = False
+        self.queued = 0
+        self.merged = 0
+        self.flushes = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped: dict[str, int] = {}
+        self.waits = 0
+
+    def register(self, table: str, on_conflict: str) -> None:
+        """
+        Declare a buffered table.
+
+        Args:
+            table: Table name
+            on_conflict: Comma separated columns of the unique key rows are upserted on
+        """
+        self._conflict[table] = tuple(column.strip() for column in on_conflict.split(","))
+        self._pending.setdefault(table, {})
+        self.dropped.setdefault(table, 0)
+
+    def _key(self, table: str, row: dict[str, any]) -> tuple:
+        return tuple(row[column] for column in self._conflict[table])
+
+    async def put(self, table: str, row: dict[str, any]) -> None:
+        """
+        Queue a row, waiting for room when the buffer is full.
+
+        Args:
+            table: A registered table
+            row: Row to upsert, must contain the table's conflict columns
+        """
+        key = self._key(table, row)
+        pending = self._pending[table]
+        if key not in pending and self._size >= self.max_pending:
+            self.waits += 1
+            if self._flusher is None:
+                await self.flush()
+            else:
+                self._wake.set()
+                async with self._space:
+                    await self._space.wait_for(lambda: self._size < self.max_pending or key in pending)
+
+        if key in pending:
+            pending[key] = {**pending[key], **row}
+            self.merged += 1
+        else:
+            pending[key] = dict(row)
+            self._size += 1
+            self.queued += 1
+
+        if self._flusher is None:
+            await self.flush()
+        elif self._size >= self.batch_rows:
+            self._wake.set()
+
+    def get(self, table: str, key: tuple) -> dict[str, any] | None:
+        """Return a copy of a queued row that has not been written yet."""
+        row = self._pending[table].get(key)
+        return dict(row) if row is not None else None
+
+    def merge(self, table: str, key: tuple, fields: dict[str, any]) -> bool:
+        """
+        Update a queued row in place.
+
+        Returns:
+            True if the row was still queued, False if it was already written
+        """
+        pending = self._pending[table]
+        if key not in pending:
+            return False
+        pending[key] = {**pending[key], **fields}
+        self.merged += 1
+        return True
+
+    async def discard(self, table: str, key: tuple) -> bool:
+        """Drop a queued row before it is written, e.g. when it is being deleted."""
+        if self._pending[table].pop(key, None) is None:
+            return False
+        await self._release(1)
+        return True
+
+    def writing(self, table: str, key: tuple) -> bool:
+        """Return True if a row is being flushed right now."""
+        return (table, key) in self._in_flight
+
+    async def wait_written(self, table: str, key: tuple) -> None:
+        """Wait until a row that is being flushed right now has been written, or queued again after a failure."""
+        while (table, key) in self._in_flight:
+            async with self._flush_lock:
+                pass
+
+    async def _release(self, count: int) -> None:
+        self._size -= count
+        async with self._space:
+            self._space.notify_all()
+
+    async def _write(self, table: str, rows: list[dict[str, any]]) -> None:
+        # PostgREST bulk upserts need the same columns in every row
+        by_columns: dict[tuple[str, ...], list[dict[str, any]]] = {}
+        for row in rows:
+            by_columns.setdefault(tuple(sorted(row)), []).append(row)
+        on_conflict = ",".join(self._conflict[table])
+        for group in by_columns.values():
+            await self._client.execute(self._client.table(table).upsert(group, on_conflict=on_conflict))
+            self.batches += 1
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Write every queued row.
+
+        Args:
+            force: Also write tables that are backing off after a failure
+
+        Returns:
+            Number of rows written
+        """
+        async with self._flush_lock:
+            written = 0
+            for table, pending in self._pending.items():
+                if not force and self._retry_at.get(table, 0) > time.monotonic():
+                    continue
+                while pending:
+                    keys = list(pending)[:self.batch_rows]
+                    batch = {key: pending.pop(key) for key in keys}
+                    self._in_flight.update((table, key) for key in keys)
+                    try:
+                        await self._write(table, list(batch.values()))
+                    except asyncio.CancelledError:
+                        # Interrupted mid-write, keep the batch for the next flush
+                        await self._requeue(table, batch)
+                        raise
+                    except Exception as e:
+                        self.failures += 1
+                        attempts = self._attempts.get(table, 0) + 1
+                        self._attempts[table] = attempts
+                        unsent = batch
+                        if isinstance(e, APIError) and attempts >= self.max_attempts:
+                            rejected, unsent_rows = await self._isolate_failures(table, list(batch.values()))
+                            unsent = {self._key(table, row): row for row in unsent_rows}
+                            if rejected:
+                                logger.error(f"Dropping {len(rejected)} of {len(batch)} buffered {table} rows rejected by the database: {e}")
+                                self.dropped[table] += len(rejected)
+                            written += len(batch) - len(rejected) - len(unsent)
+                            await self._release(len(batch) - len(unsent))
+                        if unsent:
+                            await self._requeue(table, unsent)
+                            self._back_off(table, e)
+                        else:
+                            self._attempts[table] = 0
+                            self._retry_at.pop(table, None)
+                        break
+                    finally:
+                        self._in_flight.difference_update((table, key) for key in keys)
+                    self._attempts[table] = 0
+                    self._retry_at.pop(table, None)
+                    written += len(batch)
+                    await self._release(len(batch))
+            self.flushes += 1
+            self.rows_written += written
+            return written
+
+    def _back_off(self, table: str, error: Exception) -> None:
+        delay = min(self.retry_base * 2 ** (self._attempts[table] - 1), self.retry_max)
+        self._retry_at[table] = time.monotonic() + delay
+        logger.warning(f"Buffered write to {table} failed ({self._attempts[table]} in a row), retrying in {delay:.1f}s: {error}")
+
+    async def _isolate_failures(self, table: str, rows: list[dict[str, any]]) -> tuple[list[dict[str, any]], list[dict[str, any]]]:
+        """
+        Write rows in halves down to single rows.
+
+        Returns:
+            Rows the database rejected on their own, and rows not sent because the database failed
+        """
+        middle = len(rows) // 2
+        rejected, unsent = await self._write_or_fail(table, rows[:middle])
+        more_rejected, more_unsent = await self._write_or_fail(table, rows[middle:])
+        return rejected + more_rejected, unsent + more_unsent
+
+    async def _write_or_fail(self, table: str, rows: list[dict[str, any]]) -> tuple[list[dict[str, any]], list[dict[str, any]]]:
+        if not rows:
+            return [], []
+        try:
+            await self._write(table, rows)
+            return [], []
+        except APIError as e:
+            if len(rows) == 1:
+                logger.warning(f"Buffered {table} row rejected: {e}")
+                return rows, []
+            return await self._isolate_failures(table, rows)
+        except Exception:
+            # Not a rejected row but the database itself, keep the rows for a retry
+            return [], rows
+
+    async def _requeue(self, table: str, batch: dict[tuple, dict[str, any]]) -> None:
+        """Put a batch that was not written back, without overwriting rows queued since."""
+        pending = self._pending[table]
+        collisions = 0
+        for key, row in batch.items():
+            if key in pending:
+                pending[key] = {**row, **pending[key]}
+                collisions += 1
+            else:
+                pending[key] = row
+        if collisions:
+            await self._release(collisions)
+
+    def start(self) -> None:
+        """Start flushing in the background."""
+        if self._flusher is None:
+            self._stopping = False
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Stop the background flush and write what is still queued."""
+        if self._flusher is not None:
+            # Let a flush that is under way finish rather than cancel it mid-write
+            self._stopping = True
+            self._wake.set()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush(force=True)
+        if self._size:
+            logger.error(f"{self._size} buffered rows could not be written before shutdown")
+
+    def stats(self) -> dict[str, any]:
+        """Return queue size and write counters."""
+        return {
+            "pending": self._size,
+            "queued": self.queued,
+            "merged": self.merged,
+            "flushes": self.flushes,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "failures": self.failures,
+            "dropped": sum(self.dropped.values()),
+            "dropped_by_table": dict(self.dropped),
+            "backing_off": sorted(table for table, at in self._retry_at.items() if at > time.monotonic()),
+            "backpressure_waits": self.waits,
+        }
@@ -1,9 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.admin import router as admin_router
 from app.routes.youtube import router as youtube_router
+from app.services.yt_service import yt
+from app.utils.http_client import http_client
+from app.utils.download_manager import download_manager
+from app.services.media_cache import media_cache
+from app.db.database_manager import db
+from app.db.config import rest
+from app.config import PLAN_CATALOG_REALTIME
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: start extraction workers with warm YoutubeDL instances
+    await yt.startup()
+    await http_client.start()
+    download_manager.start()
+    await media_cache.start()
+    await db.plan_catalog.start(realtime=PLAN_CATALOG_REALTIME)
+    db.access_counter.start()
+    db.write_buffer.start()
+    yield
+    # Shutdown: stop download workers without waiting for queued jobs
+    await db.plan_catalog.stop()
+    await media_cache.stop()
+    await download_manager.shutdown(wait=False)
+    # Write buffered rows first, the access count RPC only updates rows that exist
+    await db.write_buffer.stop()
+    await db.access_counter.stop()
+    await rest.aclose()
+    await http_client.aclose()
+    yt.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
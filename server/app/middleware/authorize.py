@@ -1,33 +1,96 @@
+import hashlib
+import time
 import traceback
-from fastapi.middleware import Middleware
-from app.db.config import supabase
-from fastapi import Request,Depends
+import jwt
+from fastapi.requests import HTTPConnection
+from fastapi.concurrency import run_in_threadpool
+from app.db.config import supabase, rest
+from app.config import SUPABASE_JWT_SECRET, AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL
 from app.utils.api_error import ApiError
+from app.utils.ttl_cache import TTLCache
 from app.logger import logger
 
-def verify_token(request: Request):
+# Token -> user row cache, so repeat calls from a session skip Supabase
+auth_cache = TTLCache(max_size=AUTH_CACHE_MAX_SIZE, default_ttl=AUTH_CACHE_TTL)
+
+def _token_key(token: str) -> str:
+    """Hash the token so raw credentials are never kept in memory as keys."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _decode_claims(token: str) -> tuple[dict[str, any], bool]:
+    """
+    Decode the JWT claims of a token.
+    
+    The signature is verified locally when SUPABASE_JWT_SECRET is configured
+    and the token is HS256 signed; otherwise the claims are only read so the
+    cache TTL can be tied to `exp`, and Supabase stays the source of truth.
+    
+    Returns:
+        Tuple of (claims, verified)
+    """
+    if SUPABASE_JWT_SECRET and jwt.get_unverified_header(token).get("alg") == "HS256":
+        claims = jwt.decode(
+            token,
+            SUPABASE_JWT_SECRET,
+            algorithms=["HS256"],
+            audience="authenticated",
+        )
+        return claims, True
+    return jwt.decode(token, options={"verify_signature": False}), False
+
+async def verify_token(request: HTTPConnection):
     token = request.headers.get("Authorization")
     if not token:
         raise ApiError(status_code=401, message="Authorization token is missing", error_code="UNAUTHORIZED")
     if not token.startswith("Bearer "):
         raise ApiError(status_code=401, message="Invalid token format", error_code="UNAUTHORIZED")
     token = token.split(" ")[1]
+
+    cache_key = _token_key(token)
+    user_info = auth_cache.get(cache_key)
+    if user_info is not None:
+        return user_info
+
     try:
-        user_response = supabase.auth.get_user(token)
-        user = user_response.user
-        if not user:
+        claims, verified = _decode_claims(token)
+    except jwt.PyJWTError as e:
+        logger.warning(f"Rejected token: {e}")
+        raise ApiError(status_code=401, message="Invalid token", error_code="UNAUTHORIZED")
+
+    # Never cache past the token's own expiry
+    ttl = AUTH_CACHE_TTL
+    if claims.get("exp"):
+        ttl = min(ttl, claims["exp"] - time.time())
+        if ttl <= 0:
+            raise ApiError(status_code=401, message="Token expired", error_code="UNAUTHORIZED")
+
+    try:
+        if verified:
+            user_id = claims.get("sub")
+        else:
+            user_response = await run_in_threadpool(supabase.auth.get_user, token)
+            user = user_response.user
+            user_id = user.id if user else None
+        if not user_id:
             raise ApiError(status_code=401, message="Invalid token", error_code="UNAUTHORIZED")
         
         # Get user details from the database
-        user_data = supabase.table("users").select("*").eq("id", user.id).execute()
+        user_data = await rest.execute(rest.table("users").select("*").eq("id", user_id))
         if not user_data.data:
             raise ApiError(status_code=404, message="User not found", error_code="USER_NOT_FOUND")
         
         user_info = user_data.data[0]
+        auth_cache.set(cache_key, user_info, ttl=ttl)
 
         return user_info
         
+    except ApiError:
+        raise
     except Exception as e:
         logger.error(f"❌ Error verifying token: {e}")
         logger.error(traceback.format_exc())
-        raise ApiError(status_code=401, message="Invalid token", error_code="UNAUTHORIZED")
\ No newline at end of file
+        raise ApiError(status_code=401, message="Invalid token", error_code="UNAUTHORIZED")
+
+def get_auth_cache_stats() -> dict[str, int | float]:
+    """Return hit/miss counters of the token cache."""
+    return auth_cache.stats()
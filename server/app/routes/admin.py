@@ -1,12 +1,15 @@
 from urllib import response
-from fastapi import APIRouter, Depends,Request, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect
 from app.utils.async_handler import async_handler
 from app.db.database_manager import db
-from app.middleware.authorize import verify_token
+from app.db.config import rest
+from app.services.yt_service import yt
+from app.middleware.authorize import verify_token, get_auth_cache_stats
 from app.utils.api_error import ApiError
 from pydantic import BaseModel,Field
 from datetime import datetime
-from app.utils import download_manager
+from app.utils.download_manager import download_manager
+from app.services.media_cache import media_cache
 from app.utils.admin_websocket_manager import manager
 
 router = APIRouter()
@@ -126,15 +129,69 @@ async def remove_user_plan(
     """Remove a plan from a user."""
     if not user or not user.get("is_admin", False):
         raise ApiError(status_code=401, message="Unauthorized", error_code="UNAUTHORIZED")
-    result = await db.remove_user_plan(request.plan_id)
+    result = await db.remove_user_plan(user_id, request.plan_id)
     return result
 
-@router.get("/test")
+@router.get("/metrics")
 @async_handler
-async def test_endpoint():
-    await download_manager.main()
+async def get_metrics(user=Depends(verify_token)):
+    """
+    Get in-process cache and performance counters.
+    """
+    if not user or not user.get("is_admin", False):
+        raise ApiError(status_code=401, message="Unauthorized", error_code="UNAUTHORIZED")
+
+    return {
+        "auth_cache": get_auth_cache_stats(),
+        "metadata_cache": db.get_metadata_cache_stats(),
+        "plan_catalog": db.plan_catalog.stats(),
+        "access_counts": db.access_counter.stats(),
+        "write_buffer": db.write_buffer.stats(),
+        "database": rest.stats(),
+        **yt.get_metrics(),
+        "downloads": download_manager.stats(),
+        "media_cache": media_cache.stats(),
+    }
+
+@router.get("/cache/stats")
+@async_handler
+async def get_cache_stats(fresh: bool = False, user=Depends(verify_token)):
+    """
+    Get file cache statistics: format counts and sizes, by tag.
+    
+    Args:
+        fresh: Re-aggregate in the database instead of using the running totals
+    """
+    if not user or not user.get("is_admin", False):
+        raise ApiError(status_code=401, message="Unauthorized", error_code="UNAUTHORIZED")
+
+    return await db.get_cache_stats(fresh=fresh)
+
+@router.get("/cache/formats")
+@async_handler
+async def get_cached_formats(
+    after_video_id: str | None = None,
+    after_tag: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    user=Depends(verify_token)
+):
+    """
+    Page through cached formats ordered by (video_id, tag).
     
-    return "Success"
+    Pass the returned next_cursor back as after_video_id/after_tag to get
+    the next page; it is null on the last page.
+    """
+    if not user or not user.get("is_admin", False):
+        raise ApiError(status_code=401, message="Unauthorized", error_code="UNAUTHORIZED")
+    if (after_video_id is None) != (after_tag is None):
+        raise ApiError(status_code=400, message="after_video_id and after_tag go together", error_code="BAD_REQUEST")
+
+    after = (after_video_id, after_tag) if after_video_id is not None else None
+    items = await db.get_cached_formats_page(after, limit)
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = {"after_video_id": items[-1]["video_id"], "after_tag": items[-1]["tag"]}
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.websocket("/ws/logs")
 @async_handler
@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect, status
 from app.utils.async_handler import async_handler
 from app.db.database_manager import db
 from app.middleware.authorize import verify_token
 from app.utils.api_error import ApiError
+from app.utils.download_manager import DownloadJob, download_manager
+from app.utils.download_scheduler import plan_priority_class
 from app.services.yt_service import yt
-from app.config import DEFAULT_DOWNLOAD_TIMEOUT
-from fastapi.responses import FileResponse
+from app.services.media_cache import media_cache
+from fastapi.responses import FileResponse, StreamingResponse
 from app.enums.video_qualities import VideoQuality
 from app.enums.audio_qualities import AudioQuality
-from pydantic import BaseModel
+from app.config import PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_PAGE_SIZE
+from pydantic import BaseModel, Field
 from datetime import date, datetime
+from typing import AsyncIterator
+import json
 import logging
+import os
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -53,7 +59,7 @@ async def get_youtube_suggestions(
         List of YouTube video suggestions
     """
     try:
-        suggestions = await yt.get_suggestions(q)
+        suggestions = await yt.get_suggestions(q, client_id=user.get("id"))
         return suggestions
     except Exception as e:
         logger.error(f"Failed to get suggestions for query '{q}': {str(e)}")
@@ -122,6 +128,95 @@ async def search_youtube_shorts(
         logger.error(f"Failed to search shorts for query '{query}': {str(e)}")
         raise ApiError(status_code=500, message="Failed to search shorts", error_code="SHORTS_SEARCH_ERROR")
 
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def stream_results(results: AsyncIterator[dict], stream_format: str) -> StreamingResponse:
+    """
+    Send search results as they arrive, as NDJSON lines or Server-Sent Events.
+    
+    NDJSON sends one result object per line and, on failure, a final
+    {"error", "error_code"} line. SSE sends each result as a message event,
+    then a "done" event with the result count or an "error" event.
+    
+    Args:
+        results: Async iterator of search results
+        stream_format: "ndjson" or "sse"
+        
+    Returns:
+        Streaming response writing each result as soon as it is produced
+    """
+    def encode(data: dict, event: str | None = None) -> str:
+        body = json.dumps(data, default=str)
+        if stream_format == "ndjson":
+            return body + "\n"
+        return (f"event: {event}\n" if event else "") + f"data: {body}\n\n"
+
+    async def body() -> AsyncIterator[str]:
+        count = 0
+        try:
+            async for result in results:
+                count += 1
+                yield encode(result)
+        except ApiError as e:
+            yield encode({"error": e.message, "error_code": e.error_code}, "error")
+            return
+        except Exception as e:
+            logger.error(f"Search stream failed after {count} results: {str(e)}")
+            yield encode({"error": "Search failed", "error_code": "SEARCH_STREAM_ERROR"}, "error")
+            return
+        if stream_format == "sse":
+            yield encode({"count": count}, "done")
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/video/search/stream")
+@async_handler
+async def stream_youtube_videos(
+    request: Request,
+    user=Depends(verify_token), 
+    query: str = Query(..., min_length=1, description="Search query for videos"),
+    max_results: int = Query(10, ge=1, le=50, description="Maximum number of results (1-50)"),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="ndjson or sse")
+):
+    """
+    Search YouTube videos, streaming each result as soon as yt-dlp produces it.
+    
+    Args:
+        query: Search query string
+        max_results: Maximum number of results to return (1-50)
+        stream_format: "ndjson" for one JSON object per line, "sse" for Server-Sent Events
+        
+    Returns:
+        Streaming response of VideoSearchResponse objects
+    """
+    return stream_results(yt.stream_search_videos(query, max_results), stream_format)
+
+@router.get("/shorts/search/stream")
+@async_handler
+async def stream_youtube_shorts(
+    request: Request,
+    user=Depends(verify_token), 
+    query: str = Query(..., min_length=1, description="Search query for shorts"),
+    max_results: int = Query(10, ge=1, le=50, description="Maximum number of results (1-50)"),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$", description="ndjson or sse")
+):
+    """
+    Search YouTube shorts, streaming each result as soon as yt-dlp produces it.
+    
+    Args:
+        query: Search query string
+        max_results: Maximum number of results to return (1-50)
+        stream_format: "ndjson" for one JSON object per line, "sse" for Server-Sent Events
+        
+    Returns:
+        Streaming response of VideoSearchResponse objects
+    """
+    return stream_results(yt.stream_search_shorts(query, max_results), stream_format)
+
 class PlaylistSearchResponse(BaseModel):
     playlist_id:str
     title:str
@@ -275,6 +370,10 @@ class PlaylistInfoResponse(BaseModel):
     thumbnail: str | None = None
     total_videos: int | None = None
     videos: list[dict] | None = None
+    offset: int = 0
+    limit: int | None = None
+    entries_loaded: int | None = None
+    entries_complete: bool = True
 
     class Config:
         from_attributes = True
@@ -284,233 +383,242 @@ class PlaylistInfoResponse(BaseModel):
 async def get_youtube_playlist_info(
     request: Request,
     user=Depends(verify_token), 
-    playlist_id: str = Query(..., min_length=1, description="YouTube playlist ID")
+    playlist_id: str = Query(..., min_length=1, description="YouTube playlist ID"),
+    offset: int = Query(0, ge=0, description="Position of the first video to return"),
+    limit: int = Query(PLAYLIST_PAGE_SIZE, ge=1, le=PLAYLIST_MAX_PAGE_SIZE, description="Number of videos to return")
 ):
     """
-    Get YouTube playlist information and video list.
+    Get YouTube playlist information and one page of its video list.
     
     Args:
-        url: YouTube playlist URL
+        playlist_id: YouTube playlist ID
+        offset: Position of the first video to return
+        limit: Number of videos to return
         
     Returns:
-        Playlist information including title, video count, video list, etc.
+        Playlist information including title, video count, a page of videos, etc.
     """
     try:
-        playlist_info = await yt.get_playlist_info(playlist_id)
+        playlist_info = await yt.get_playlist_info(playlist_id, offset, limit)
         return playlist_info
     except Exception as e:
         logger.error(f"Failed to get playlist info for '{playlist_id}': {str(e)}")
         raise ApiError(status_code=500, message="Failed to get playlist information", error_code="PLAYLIST_INFO_ERROR")
 
-# @router.get("/video/download")
-# @async_handler
-# async def download_youtube_video(
-#     request: Request,
-#     user=Depends(verify_token), 
-#     video_id: str = Query(..., min_length=1, description="YouTube video ID"),
-#     quality: str = Query(..., description=f"Video quality: {', '.join(VideoQuality.list())}"),
-#     user_plan_id: str = Query(..., description="User plan ID to use for download"),
-#     download_subtitles: bool = Query(False, description="Whether to download subtitles")
-# ):
-#     """
-#     Download YouTube video with specified quality.
-    
-#     Args:
-#         video_id: YouTube video ID
-#         quality: Video quality (must be valid VideoQuality)
-#         user_plan_id: ID of the user plan to use for this download
-#         download_subtitles: Whether to include subtitles
-        
-#     Returns:
-#         File download response with the video file
-#     """
-#     # Validate quality
-#     if quality not in VideoQuality.list():
-#         raise ApiError(
-#             status_code=400, 
-#             message=f"Invalid quality: {quality}. Valid options are: {', '.join(VideoQuality.list())}", 
-#             error_code="INVALID_QUALITY"
-#         )
-    
-#     try:
-#         # Verify user plan ownership
-#         user_plan = await db.get_user_plan(user_plan_id)
-#         if user_plan["user_id"] != user["id"]:
-#             raise ApiError(status_code=403, message="Access denied to this plan", error_code="ACCESS_DENIED")
-        
-#         # Get video information
-        
-#         video_info = await yt.get_video_info(video_id)
-#         print(f"Video info for {video_id}: {video_info}")
+class DownloadRequest(BaseModel):
+    video_id: str = Field(..., min_length=1, description="YouTube video ID")
+    quality: str = Field(..., description="Video or audio quality")
+    user_plan_id: str = Field(..., description="User plan ID to use for download")
+    download_subtitles: bool = Field(False, description="Whether to embed subtitles")
+
+class DownloadJobResponse(BaseModel):
+    job_id: str
+    video_id: str
+    quality_tag: str
+    status: str
+    fan_out: int = 1
+    priority_class: str | None = None
+    progress: dict = {}
+    error: str | None = None
+    created_at: float
+    finished_at: float | None = None
 
-#         video_filesize_approx = get_filesize_by_quality(video_info, quality,"video_qualities")
-#         ytdlp_timeout = video_filesize_approx / (2 * 1024 * 1024) + DEFAULT_DOWNLOAD_TIMEOUT if video_filesize_approx else DEFAULT_DOWNLOAD_TIMEOUT
+async def store_downloaded_format(job: DownloadJob) -> None:
+    """Add a finished download to the file cache, once per job."""
+    if job.status != "completed":
+        return
+    await db.store_cached_format({
+        "video_id": job.video_id,
+        "tag": job.quality_tag,
+        "path": job.filepath,
+        "filesize": job.filesize,
+        "vcodec": job.vcodec,
+        "acodec": job.acodec,
+    })
 
-#         if not video_info:
-#             raise ApiError(status_code=404, message="Video not found", error_code="VIDEO_NOT_FOUND")
-        
-#         # Extract client information
-#         ip, fingerprint = get_client_info(request)
-        
-#         # Store download request in database
-#         download_request = await db.store_download_request(
-#             user_id=user["id"], 
-#             user_plan_id=user_plan_id,  # Use the parameter directly instead of user_plan["id"]
-#             source_url=yt.get_video_url(video_id), 
-#             video_id=video_info["video_id"], 
-#             thumbnail_url=video_info['thumbnail'], 
-#             title=video_info['title'], 
-#             video_quality=quality, 
-#             audio_quality=None, 
-#             subtitles=download_subtitles, 
-#             ip=ip, 
-#             fingerprint=fingerprint
-#         )
-
-#         try:
-#             # Download the video
-#             video_path = await yt.download_video(video_id, quality, download_subtitles,ytdlp_timeout)
-            
-#             if not video_path:
-#                 await db.store_download_error(download_request["id"], "Failed to download video")
-#                 raise ApiError(status_code=500, message="Failed to download video", error_code="DOWNLOAD_FAILED")
-            
-#             # Mark download as completed
-#             await db.store_download_completion(download_request["id"])
-            
-#             # Return file response
-#             return FileResponse(
-#                 video_path,
-#                 media_type="application/octet-stream",
-#                 headers={"Content-Disposition": f"attachment; filename={video_info['title']}.mp4"}
-#             )
-            
-#         except Exception as download_error:
-#             await db.store_download_error(download_request["id"], str(download_error))
-#             logger.error(f"Video download failed for {video_id}: {str(download_error)}")
-#             raise ApiError(status_code=500, message="Video download failed", error_code="DOWNLOAD_FAILED")
-            
-#     except ApiError:
-#         raise
-#     except Exception as e:
-#         logger.error(f"Unexpected error in video download: {str(e)}")
-#         raise ApiError(status_code=500, message="Internal server error", error_code="INTERNAL_ERROR")
-
-# @router.get("/audio/download")
-# @async_handler
-# async def download_youtube_audio(
-#     request: Request,
-#     user=Depends(verify_token), 
-#     url: str = Query(..., min_length=1, description="YouTube video URL or video ID"),
-#     quality: str = Query(..., description=f"Audio quality: {', '.join(AudioQuality.list())}"),
-#     user_plan_id: str = Query(..., description="User plan ID to use for download")
-# ):
-#     """
-#     Download YouTube audio with specified quality.
+download_manager.add_listener(store_downloaded_format)
+download_manager.add_listener(media_cache.on_download)
+
+async def queue_download(request: Request, user: dict, body: DownloadRequest, audio_only: bool) -> dict[str, any]:
+    """
+    Queue a download job, or complete it immediately from the file cache.
     
-#     Args:
-#         url: YouTube video URL or video ID
-#         quality: Audio quality (must be valid AudioQuality)
-#         user_plan_id: ID of the user plan to use for this download
+    Args:
+        request: FastAPI request object
+        user: Authenticated user
+        body: Download request
+        audio_only: Download an mp3 instead of a video
         
-#     Returns:
-#         File download response with the audio file
-#     """
-#     # Extract video ID from URL if needed
-#     if url.startswith('http'):
-#         # Extract video ID from URL
-#         if 'watch?v=' in url:
-#             video_id = url.split('watch?v=')[1].split('&')[0]
-#         elif 'youtu.be/' in url:
-#             video_id = url.split('youtu.be/')[1].split('?')[0]
-#         else:
-#             raise ApiError(
-#                 status_code=400, 
-#                 message="Invalid YouTube URL format", 
-#                 error_code="INVALID_URL"
-#             )
-#     else:
-#         # It's already a video ID
-#         video_id = url
+    Returns:
+        Snapshot of the download job
+    """
+    # Verify user plan ownership
+    user_plan = await db.get_user_plan(body.user_plan_id)
+    if not user_plan:
+        raise ApiError(status_code=404, message="User plan not found", error_code="PLAN_NOT_FOUND")
+    if user_plan["user_id"] != user["id"]:
+        raise ApiError(status_code=403, message="Access denied to this plan", error_code="ACCESS_DENIED")
+
+    video_info = await yt.get_video_info(body.video_id)
+    if not video_info:
+        raise ApiError(status_code=404, message="Video not found", error_code="VIDEO_NOT_FOUND")
+
+    # Pin the exact format the index chose when extracting this video
+    qualities = video_info.get("audio_qualities" if audio_only else "video_qualities") or []
+    format_id = next((q.get("format_id") for q in qualities if q.get("format") == body.quality), None)
+    tag, ydl_opts = yt.get_download_options(body.video_id, body.quality, audio_only, body.download_subtitles, format_id)
+
+    # Extract client information
+    ip, fingerprint = get_client_info(request)
+
+    # Store download request in database
+    download_request = await db.store_download_request(
+        user_id=user["id"],
+        user_plan_id=body.user_plan_id,
+        source_url=yt.get_video_url(body.video_id),
+        video_id=video_info["video_id"],
+        thumbnail_url=video_info.get("thumbnail"),
+        title=video_info.get("title"),
+        video_quality=None if audio_only else body.quality,
+        audio_quality=body.quality if audio_only else None,
+        subtitles=body.download_subtitles,
+        ip=ip,
+        fingerprint=fingerprint
+    )
+
+    # Serve straight from the file cache when this format was downloaded before
+    cached_format = await db.get_cached_format(body.video_id, tag)
+    if cached_format:
+        if os.path.exists(cached_format["path"]):
+            media_cache.touch(cached_format["path"])
+            job_id = download_manager.add_completed(body.video_id, tag, cached_format["path"], video_info.get("title"))
+            job = download_manager.get_job(job_id)
+            job.requesters.add(user["id"])
+            await db.store_download_completion(download_request["id"])
+            return job.snapshot()
+        # The file is gone, drop the stale row and download again
+        await db.remove_cached_format(body.video_id, tag)
+
+    async def on_complete(job: DownloadJob) -> None:
+        if job.status == "completed":
+            await db.store_download_completion(download_request["id"])
+        else:
+            await db.store_download_error(download_request["id"], job.error or "Download failed")
+
+    job_id = download_manager.add_download(
+        body.video_id,
+        yt.get_video_url(body.video_id),
+        tag,
+        ydl_opts,
+        title=video_info.get("title"),
+        user_id=user["id"],
+        priority_class=plan_priority_class(user_plan),
+        on_complete=on_complete,
+    )
+    if not job_id:
+        await db.store_download_error(download_request["id"], "Download manager is not running")
+        raise ApiError(status_code=503, message="Downloads are unavailable", error_code="DOWNLOADS_UNAVAILABLE")
+
+    job = download_manager.get_job(job_id)
+    job.requesters.add(user["id"])
+    return job.snapshot()
+
+def get_user_job(job_id: str, user: dict) -> DownloadJob:
+    """
+    Look up a download job the user is allowed to see.
     
-#     # Validate quality
-#     if quality not in AudioQuality.list():
-#         raise ApiError(
-#             status_code=400, 
-#             message=f"Invalid quality: {quality}. Valid options are: {', '.join(AudioQuality.list())}", 
-#             error_code="INVALID_QUALITY"
-#         )
+    Raises:
+        ApiError: If the job does not exist or belongs to someone else
+    """
+    job = download_manager.get_job(job_id)
+    if not job or (user["id"] not in job.requesters and not user.get("is_admin", False)):
+        raise ApiError(status_code=404, message="Download job not found", error_code="JOB_NOT_FOUND")
+    return job
+
+@router.post("/video/download", response_model=DownloadJobResponse, status_code=202)
+@async_handler
+async def download_youtube_video(
+    request: Request,
+    body: DownloadRequest,
+    user=Depends(verify_token)
+):
+    """
+    Queue a YouTube video download with specified quality.
     
-#     try:
-#         # Verify user plan exists and belongs to user
-#         user_plan = await db.get_user_plan(user_plan_id)
-#         if not user_plan:
-#             raise ApiError(status_code=404, message="User plan not found", error_code="PLAN_NOT_FOUND")
+    Args:
+        body: Video ID, quality (must be valid VideoQuality), user plan and subtitle flag
         
-#         if user_plan["user_id"] != user["id"]:
-#             raise ApiError(status_code=403, message="Access denied to this plan", error_code="ACCESS_DENIED")
+    Returns:
+        The download job; poll /download/{job_id} or open its WebSocket for progress
+    """
+    return await queue_download(request, user, body, audio_only=False)
 
-#         # Get video information
-#         video_info = await yt.get_video_info(video_id)
-#         if not video_info:
-#             raise ApiError(status_code=404, message="Video not found", error_code="VIDEO_NOT_FOUND")
-        
-#         # Extract client information
-#         ip, fingerprint = get_client_info(request)
+@router.post("/audio/download", response_model=DownloadJobResponse, status_code=202)
+@async_handler
+async def download_youtube_audio(
+    request: Request,
+    body: DownloadRequest,
+    user=Depends(verify_token)
+):
+    """
+    Queue a YouTube audio download with specified quality.
+    
+    Args:
+        body: Video ID, quality (must be valid AudioQuality) and user plan
         
-#         # Store download request in database
-#         download_request = await db.store_download_request(
-#             user_id=user["id"], 
-#             user_plan_id=user_plan_id,  # Use the parameter directly instead of user_plan["id"]
-#             source_url=yt.get_video_url(video_id), 
-#             video_id=video_info["video_id"], 
-#             thumbnail_url=video_info['thumbnail'], 
-#             title=video_info['title'], 
-#             video_quality=None, 
-#             audio_quality=quality, 
-#             subtitles=False,
-#             ip=ip, 
-#             fingerprint=fingerprint
-#         )
-
-#         try:
-#             # Get audio properties and download
-#             audio_props = yt.get_audio_ytdlp_query(quality)
-#             audio_path = await yt.download_audio(
-#                 video_id=video_info["video_id"], 
-#                 quality=quality,
-#                 audio_query=audio_props["query"], 
-#                 audio_tag=audio_props["tag"]
-#             )
-
-#             if not audio_path:
-#                 await db.store_download_error(download_request["id"], "Failed to download audio")
-#                 raise ApiError(status_code=500, message="Failed to download audio", error_code="DOWNLOAD_FAILED")
-            
-#             # Mark download as completed
-#             await db.store_download_completion(download_request["id"])
-            
-#             # Return file response
-#             return FileResponse(
-#                 audio_path,
-#                 media_type="application/octet-stream",
-#                 headers={"Content-Disposition": f"attachment; filename={video_info['title']}.mp3"}
-#             )
-            
-#         except Exception as download_error:
-#             await db.store_download_error(download_request["id"], str(download_error))
-#             logger.error(f"Audio download failed for {video_id}: {str(download_error)}")
-#             raise ApiError(status_code=500, message="Audio download failed", error_code="DOWNLOAD_FAILED")
-            
-#     except ApiError:
-#         raise
-#     except Exception as e:
-#         logger.error(f"Unexpected error in audio download: {str(e)}")
-#         raise ApiError(status_code=500, message="Internal server error", error_code="INTERNAL_ERROR")
-
-
-# def get_filesize_by_quality(data, quality,col):
-#     for item in data[col]:
-#         if item['format'] == quality:
-#             return item['filesize']
-#     return None
\ No newline at end of file
+    Returns:
+        The download job; poll /download/{job_id} or open its WebSocket for progress
+    """
+    return await queue_download(request, user, body, audio_only=True)
+
+@router.get("/download/{job_id}", response_model=DownloadJobResponse)
+@async_handler
+async def get_download_job(job_id: str, user=Depends(verify_token)):
+    """
+    Get the status and progress of a download job.
+    """
+    return get_user_job(job_id, user).snapshot()
+
+@router.get("/download/{job_id}/file")
+@async_handler
+async def get_download_file(job_id: str, user=Depends(verify_token)):
+    """
+    Serve the file of a completed download job.
+    """
+    job = get_user_job(job_id, user)
+    if job.status != "completed":
+        raise ApiError(status_code=409, message=f"Download is {job.status}", error_code="DOWNLOAD_NOT_READY")
+    if not os.path.exists(job.filepath):
+        raise ApiError(status_code=410, message="File was evicted from the cache, download it again", error_code="FILE_EVICTED")
+    media_cache.touch(job.filepath)
+
+    _, ext = os.path.splitext(job.filepath)
+    return FileResponse(
+        job.filepath,
+        media_type="application/octet-stream",
+        filename=f"{job.title or job.video_id}{ext}"
+    )
+
+@router.websocket("/download/{job_id}/ws")
+async def download_job_websocket(websocket: WebSocket, job_id: str, user=Depends(verify_token)):
+    """
+    Stream progress snapshots of a download job until it finishes.
+    """
+    job = download_manager.get_job(job_id)
+    if not job or (user["id"] not in job.requesters and not user.get("is_admin", False)):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    updates = job.subscribe()
+    try:
+        while True:
+            snapshot = await updates.get()
+            await websocket.send_json(snapshot)
+            if snapshot["status"] in ("completed", "failed"):
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job.unsubscribe(updates)
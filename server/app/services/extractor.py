@@ -0,0 +1,355 @@
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import threading
+from typing import AsyncIterator, Callable, Iterator
+from app.config import COOKIE_PATH, YDL_POOL_MAX_SIZE, YDL_POOL_MAX_USES, EXTRACTION_FAST_CLIENTS
+from app.logger import logger
+from app.utils.ydl_pool import YoutubeDLPool
+
+# Option profiles, one warm YoutubeDL pool each
+SEARCH_FLAT = "search-flat"
+INFO_FAST = "info-fast"
+INFO_FULL = "info-full"
+PLAYLIST_FLAT = "playlist-flat"
+
+# Video info profiles in the order they are tried, each asking more player clients
+INFO_TIERS = (INFO_FAST, INFO_FULL)
+
+def _profile_options() -> dict[str, dict[str, any]]:
+    """Build the yt-dlp options of every extraction profile."""
+    profiles = {
+        SEARCH_FLAT: {
+            "quiet": True,
+            "retries": 3,
+            "extract_flat": True,
+            "forcejson": True,
+            "noplaylist": True,
+        },
+        INFO_FAST: {
+            "skip_download": True,
+            "retries": 3,
+            "forcejson": True,
+            "no_warnings": False,
+            "encoding": "utf-8",
+            'extractor_args': {
+                'youtube': {
+                    'player_client': EXTRACTION_FAST_CLIENTS
+                }
+            }
+        },
+        INFO_FULL: {
+            "skip_download": True,
+            "retries": 3,
+            "forcejson": True,
+            "no_warnings": False,
+            "encoding": "utf-8",
+            'extractor_args': {
+                'youtube': {
+                    'player_client': ['all']
+                }
+            }
+        },
+        PLAYLIST_FLAT: {
+            "quiet": True,
+            "retries": 3,
+            "extract_flat": True,
+            "dump_single_json": True,
+            "is_playlist": True,
+            "encoding": "utf-8",
+        },
+    }
+
+    if os.path.exists(COOKIE_PATH):
+        profiles[SEARCH_FLAT]["cookiefile"] = COOKIE_PATH
+        profiles[INFO_FAST]["cookiefile"] = COOKIE_PATH
+        profiles[INFO_FULL]["cookiefile"] = COOKIE_PATH
+
+    return profiles
+
+class ExtractionError(Exception):
+    """Picklable stand-in for yt-dlp errors, safe to raise across a process boundary."""
+
+_pools: dict[str, YoutubeDLPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(profile: str) -> YoutubeDLPool:
+    """
+    Return the YoutubeDL pool of a profile, creating the pools on first use.
+
+    Args:
+        profile: One of SEARCH_FLAT, INFO_FAST, INFO_FULL or PLAYLIST_FLAT
+
+    Returns:
+        The profile's YoutubeDLPool
+    """
+    with _pools_lock:
+        if not _pools:
+            for name, opts in _profile_options().items():
+                _pools[name] = YoutubeDLPool(name, opts, max_size=YDL_POOL_MAX_SIZE, max_uses=YDL_POOL_MAX_USES)
+        return _pools[profile]
+
+def warm_pools(count: int | None = None) -> None:
+    """
+    Pre-initialise every profile's pool. Blocking, run it off the event loop.
+
+    Args:
+        count: Idle instances per pool (default: the pool's max size)
+    """
+    for profile in (SEARCH_FLAT, *INFO_TIERS, PLAYLIST_FLAT):
+        get_pool(profile).warm(count)
+
+def close_pools() -> None:
+    """Close the idle instances of every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    """Return the counters of every pool created so far."""
+    with _pools_lock:
+        return {name: pool.stats() for name, pool in _pools.items()}
+
+def extract_info(profile: str, url: str, overrides: dict[str, any] | None = None) -> dict[str, any]:
+    """
+    Run yt-dlp extract_info on a pooled instance. Blocking.
+
+    Args:
+        profile: Extraction profile to use
+        url: URL or search query (e.g. "ytsearch10:lofi")
+        overrides: Per-call yt-dlp params, e.g. {"playlistend": 5}
+
+    Returns:
+        yt-dlp info dictionary
+
+    Raises:
+        ExtractionError: If yt-dlp fails
+    """
+    try:
+        with get_pool(profile).checkout(overrides) as ydl:
+            return ydl.extract_info(url, download=False)
+    except Exception as e:
+        # yt-dlp errors can hold unpicklable state, keep only the message
+        raise ExtractionError(str(e)) from None
+
+# Fields kept when results cross a process boundary, trimmed to what YoutubeService reads
+_FORMAT_FIELDS = (
+    "format_id", "format_note", "ext", "height", "abr", "tbr",
+    "vcodec", "acodec", "filesize", "filesize_approx",
+)
+_ENTRY_FIELDS = (
+    "id", "title", "url", "description", "duration", "uploader", "upload_date", "thumbnails",
+    "playlist_index",
+)
+
+def _pick(info: dict[str, any], fields: tuple[str, ...]) -> dict[str, any]:
+    return {field: info[field] for field in fields if field in info}
+
+def extract_video_info(url: str, profile: str = INFO_FULL) -> dict[str, any]:
+    """
+    Extract a single video with one of the INFO_TIERS profiles. Blocking.
+
+    Returns:
+        Compact info dictionary with only the metadata and format fields
+        get_video_info uses, cheap to pickle back from a worker process
+    """
+    info = extract_info(profile, url)
+    compact = _pick(info, ("id", "title", "duration", "uploader", "upload_date", "description"))
+    compact["formats"] = [_pick(fmt, _FORMAT_FIELDS) for fmt in info.get("formats") or []]
+    return compact
+
+def extract_flat(profile: str, url: str, overrides: dict[str, any] | None = None) -> dict[str, any]:
+    """
+    Run a flat (search or playlist) extraction. Blocking.
+
+    Returns:
+        Compact info dictionary with playlist metadata and trimmed entries
+    """
+    info = extract_info(profile, url, overrides)
+    compact = _pick(info, ("id", "title", "uploader", "description", "thumbnails", "playlist_count"))
+    compact["entries"] = [
+        _pick(entry, _ENTRY_FIELDS) if entry else None
+        for entry in info.get("entries") or []
+    ]
+    return compact
+
+def iter_flat(profile: str, url: str, overrides: dict[str, any] | None = None) -> Iterator[dict[str, any]]:
+    """
+    Yield the trimmed entries of a flat (search) extraction as yt-dlp produces them. Blocking.
+
+    Runs extract_info with process=False, so the entries generator is
+    consumed here and each result page (about 20 entries for YouTube
+    search) is yielded as soon as it is fetched, not after the last one.
+
+    Raises:
+        ExtractionError: If yt-dlp fails
+    """
+    try:
+        with get_pool(profile).checkout(overrides) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            for entry in info.get("entries") or []:
+                if entry:
+                    yield _pick(entry, _ENTRY_FIELDS)
+    except Exception as e:
+        raise ExtractionError(str(e)) from None
+
+def _produce(put: Callable[[tuple[str, any]], None], fn: Callable[..., Iterator[any]], args: tuple) -> None:
+    """Run generator function fn(*args), passing ("item", x), then ("error", e) or ("done", None) to put."""
+    try:
+        for item in fn(*args):
+            if put(("item", item)) is False:
+                return
+        put(("done", None))
+    except Exception as e:
+        put(("error", e))
+
+def _produce_to_queue(queue: any, fn: Callable[..., Iterator[any]], args: tuple) -> None:
+    """Worker process side of ExtractionEngine.stream: send fn's items through a manager queue."""
+    _produce(queue.put, fn, args)
+
+def _init_worker() -> None:
+    """Process pool initializer: keep this worker's YoutubeDL state warm."""
+    # A worker runs one extraction at a time, one instance per profile is enough
+    warm_pools(count=1)
+
+class ExtractionEngine:
+    """
+    Runs blocking extraction functions off the event loop.
+    
+    In "thread" mode calls run on a thread pool sharing this process's
+    YoutubeDL pools. In "process" mode they run on long-lived worker
+    processes, each with its own warm pools, so CPU-bound yt-dlp parsing
+    is not serialized on the GIL. Functions and their results must be
+    picklable in process mode, which is why they return compact dicts.
+    """
+    
+    MODES = ("thread", "process")
+
+    def __init__(self, mode: str = "thread", max_workers: int = 5) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid extraction mode: {mode}. Valid options are: {', '.join(self.MODES)}")
+        if max_workers <= 0:
+            raise ValueError("max_workers must be a positive integer")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self._executor = None
+        # Queues for streamed results from worker processes, started on first use
+        self._manager = None
+
+    def _ensure_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Extraction engine started in {self.mode} mode with {self.max_workers} workers")
+        return self._executor
+
+    async def start(self) -> None:
+        """Create the executor and warm the YoutubeDL pools it will use."""
+        executor = self._ensure_executor()
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            # Spawn the workers now, their initializer warms their pools
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, os.getpid) for _ in range(self.max_workers)
+            ))
+        else:
+            await loop.run_in_executor(executor, warm_pools)
+
+    async def run(self, fn: Callable[..., any], *args: any) -> any:
+        """
+        Run fn(*args) on the engine's executor.
+
+        Args:
+            fn: Module-level blocking function, e.g. extract_video_info
+            *args: Positional arguments for fn
+
+        Returns:
+            The function's result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure_executor(), functools.partial(fn, *args))
+
+    async def stream(self, fn: Callable[..., Iterator[any]], *args: any) -> AsyncIterator[any]:
+        """
+        Run generator function fn(*args) on the engine's executor, yielding its items as they are produced.
+
+        In thread mode items are handed to the event loop one by one and
+        the producer stops at its next item once the consumer goes away.
+        In process mode they come back through a manager queue and the
+        worker runs fn to the end.
+
+        Args:
+            fn: Module-level blocking generator function, e.g. iter_flat
+            *args: Positional arguments for fn
+
+        Yields:
+            The function's items
+
+        Raises:
+            Whatever fn raises, e.g. ExtractionError
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._ensure_executor()
+        if self.mode == "process":
+            queue = self._ensure_manager().Queue()
+            future = loop.run_in_executor(executor, functools.partial(_produce_to_queue, queue, fn, args))
+
+            async def get() -> tuple[str, any]:
+                return await loop.run_in_executor(None, queue.get)
+        else:
+            queue = asyncio.Queue()
+            stopped = threading.Event()
+
+            def put(message: tuple[str, any]) -> bool:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+                return not stopped.is_set()
+
+            future = loop.run_in_executor(executor, functools.partial(_produce, put, fn, args))
+            get = queue.get
+
+        try:
+            while True:
+                kind, value = await get()
+                if kind == "item":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    break
+            await future
+        finally:
+            if self.mode == "thread":
+                stopped.set()
+
+    def _ensure_manager(self) -> any:
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    def stats(self) -> dict[str, any]:
+        """Return the engine mode and, in thread mode, this process's pool counters."""
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "pools": pool_stats() if self.mode == "thread" else {},
+        }
+
+    def shutdown(self) -> None:
+        """Stop the workers and close this process's idle YoutubeDL instances."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+        close_pools()
@@ -0,0 +1,265 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from app.config import (
+    DOWNLOADS_DIR, MAX_CACHE_SIZE, CLEANUP_THRESHOLD, CLEANUP_TARGET,
+    CACHE_TTL_DAYS, CACHE_SWEEP_INTERVAL, CACHE_SWEEP_BATCH_SIZE, CACHE_SWEEP_BATCH_PAUSE,
+)
+from app.db.database_manager import db
+from app.logger import logger
+from app.utils.api_error import ApiError
+
+
+def _disk_usage(root: str) -> int:
+    """Total size in bytes of every file below root. Blocking."""
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove_file(path: str) -> int:
+    """
+    Delete a cached file and its then empty video directory. Blocking.
+
+    Returns:
+        Bytes freed, 0 if the file was already gone
+    """
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+    return size
+
+
+class MediaCache:
+    """
+    Keeps the downloaded files under DOWNLOADS_DIR within MAX_CACHE_SIZE.
+
+    Bytes on disk are tracked as downloads finish. Once usage crosses
+    CLEANUP_THRESHOLD of the limit, files are evicted until it drops to
+    CLEANUP_TARGET. The cheapest file to lose goes first: a file's value is
+    (access_count + 1) / (size in MB * (1 + hours since last use)), so big,
+    rarely used, stale files are evicted before small popular ones.
+
+    Independently, a periodic sweep removes every cached row older than
+    CACHE_TTL_DAYS together with its file.
+    """
+
+    def __init__(self, root: str = DOWNLOADS_DIR, max_size: int = MAX_CACHE_SIZE, threshold: float = CLEANUP_THRESHOLD, target: float = CLEANUP_TARGET) -> None:
+        if not 0 < target < threshold <= 1:
+            raise ValueError("Expected 0 < target < threshold <= 1")
+
+        self.root = str(root)
+        self.max_size = max_size
+        self.threshold_bytes = int(max_size * threshold)
+        self.target_bytes = int(max_size * target)
+        self.bytes_used = 0
+        self._last_used: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.files_evicted = 0
+        self.bytes_reclaimed = 0
+        self.last_run_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self._sweeper: asyncio.Task | None = None
+        self.sweeps = 0
+        self.rows_expired = 0
+        self.files_expired = 0
+
+    async def start(self, sweep_interval: float = CACHE_SWEEP_INTERVAL) -> None:
+        """
+        Measure the current cache size, evict if it is already over the
+        threshold and start the periodic expiry sweep.
+
+        Args:
+            sweep_interval: Seconds between sweeps, 0 disables them
+        """
+        os.makedirs(self.root, exist_ok=True)
+        self.bytes_used = await run_in_threadpool(_disk_usage, self.root)
+        logger.info(f"Media cache holds {self.bytes_used / (1024 * 1024):.1f} MB of {self.max_size / (1024 * 1024):.0f} MB")
+        self._maybe_evict()
+        if sweep_interval > 0 and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_periodically(sweep_interval))
+
+    async def stop(self) -> None:
+        """Cancel the sweep and any running eviction."""
+        for task in (self._sweeper, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._sweeper = None
+
+    async def _sweep_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep_expired()
+            except Exception as e:
+                logger.error(f"Expired cache sweep failed: {e}")
+
+    async def _remove_expired_files(self, rows: list[dict[str, any]]) -> None:
+        for row in rows:
+            if not row.get("path"):
+                continue
+            freed = await run_in_threadpool(_remove_file, row["path"])
+            self._last_used.pop(row["path"], None)
+            self.bytes_used = max(self.bytes_used - freed, 0)
+            if freed:
+                self.files_expired += 1
+
+    async def sweep_expired(self, days_old: int = CACHE_TTL_DAYS) -> dict[str, int]:
+        """
+        Delete cache rows older than days_old, and the files of expired formats.
+
+        Returns:
+            dictionary with the expired row counts per table
+        """
+        async with self._lock:
+            result = await db.cleanup_expired_cache(
+                days_old,
+                batch_size=CACHE_SWEEP_BATCH_SIZE,
+                batch_pause=CACHE_SWEEP_BATCH_PAUSE,
+                on_formats_deleted=self._remove_expired_files,
+            )
+        self.sweeps += 1
+        self.rows_expired += result["total_cleaned"]
+        return result
+
+    def touch(self, path: str) -> None:
+        """Record that a cached file was just served."""
+        self._last_used[path] = time.time()
+
+    async def on_download(self, job: any) -> None:
+        """DownloadManager listener: account for a finished download's file."""
+        if job.status != "completed" or not job.filesize:
+            return
+        self.bytes_used += job.filesize
+        self.touch(job.filepath)
+        self._maybe_evict()
+
+    def _maybe_evict(self) -> None:
+        if self.bytes_used < self.threshold_bytes:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_eviction())
+
+    async def _run_eviction(self) -> None:
+        try:
+            await self.evict()
+        except Exception as e:
+            logger.error(f"Media cache eviction failed: {e}")
+
+    def _score(self, row: dict[str, any], now: float) -> float:
+        last_used = self._last_used.get(row["path"])
+        if last_used is None:
+            try:
+                last_used = datetime.fromisoformat(row["created_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                last_used = now
+        size_mb = max((row.get("filesize") or 0) / (1024 * 1024), 0.01)
+        hours_idle = max(now - last_used, 0) / 3600
+        # Include accesses still buffered in memory
+        accesses = (row.get("access_count") or 0) + db.access_counter.pending(row["video_id"], row["tag"])
+        return (accesses + 1) / (size_mb * (1 + hours_idle))
+
+    async def _eviction_candidates(self, needed: int) -> list[dict[str, any]]:
+        """
+        Stream cached_formats and keep only the lowest value rows covering `needed` bytes.
+
+        Memory is bounded by the number of files to evict, not the table size.
+
+        Returns:
+            Rows ordered from least to most valuable
+        """
+        now = time.time()
+        order = itertools.count()
+        # Max-heap on value: the most valuable candidate sits on top, ready to be dropped
+        heap: list[tuple[float, int, dict[str, any]]] = []
+        covered = 0
+        async for row in db.iter_cached_formats(columns="video_id,tag,path,filesize,access_count,created_at"):
+            if not row.get("path"):
+                continue
+            heapq.heappush(heap, (-self._score(row, now), next(order), row))
+            covered += row.get("filesize") or 0
+            while heap and covered - (heap[0][2].get("filesize") or 0) >= needed:
+                _, _, dropped = heapq.heappop(heap)
+                covered -= dropped.get("filesize") or 0
+        return [row for _, _, row in sorted(heap, key=lambda entry: -entry[0])]
+
+    async def evict(self) -> dict[str, int | float]:
+        """
+        Evict the lowest value files until usage is at or below the target.
+
+        Deletes both the file and its cached_formats row.
+
+        Returns:
+            dictionary with files evicted, bytes reclaimed and run time
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            # Re-measure so drift from failed writes or manual deletes is corrected
+            self.bytes_used = await run_in_threadpool(_disk_usage, self.root)
+            evicted = reclaimed = 0
+
+            if self.bytes_used > self.target_bytes:
+                for row in await self._eviction_candidates(self.bytes_used - self.target_bytes):
+                    if self.bytes_used <= self.target_bytes:
+                        break
+                    try:
+                        await db.remove_cached_format(row["video_id"], row["tag"])
+                    except ApiError as e:
+                        if e.status_code != 404:
+                            logger.warning(f"Could not evict {row['video_id']}/{row['tag']}: {e.message}")
+                            continue
+                    freed = await run_in_threadpool(_remove_file, row["path"])
+                    self._last_used.pop(row["path"], None)
+                    self.bytes_used -= freed
+                    reclaimed += freed
+                    evicted += 1
+
+            elapsed = time.perf_counter() - started
+            self.runs += 1
+            self.files_evicted += evicted
+            self.bytes_reclaimed += reclaimed
+            self.last_run_seconds = elapsed
+            self.total_run_seconds += elapsed
+            if evicted:
+                logger.info(f"Evicted {evicted} cached files, reclaimed {reclaimed / (1024 * 1024):.1f} MB in {elapsed:.2f}s")
+            return {"files_evicted": evicted, "bytes_reclaimed": reclaimed, "seconds": round(elapsed, 3)}
+
+    def stats(self) -> dict[str, int | float]:
+        """Return cache usage and eviction counters."""
+        return {
+            "bytes_used": self.bytes_used,
+            "max_size": self.max_size,
+            "threshold_bytes": self.threshold_bytes,
+            "target_bytes": self.target_bytes,
+            "usage_ratio": round(self.bytes_used / self.max_size, 4),
+            "eviction_runs": self.runs,
+            "files_evicted": self.files_evicted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_eviction_seconds": round(self.last_run_seconds, 3),
+            "total_eviction_seconds": round(self.total_run_seconds, 3),
+            "expiry_sweeps": self.sweeps,
+            "rows_expired": self.rows_expired,
+            "files_expired": self.files_expired,
+        }
+
+
+# Global media cache instance
+media_cache = MediaCache()
@@ -3,15 +3,34 @@ import httpx
 import urllib.parse
 import json
 import random
-import concurrent
+import os
+import time
 import asyncio
+import contextlib
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
+from datetime import datetime
 from app.utils.api_error import ApiError
-import os
-from yt_dlp import YoutubeDL
-from app.config import COOKIE_PATH
+from app.config import (
+    DOWNLOADS_DIR, COOKIE_PATH,
+    EXTRACTION_BACKEND, EXTRACTION_WORKERS,
+    SUGGESTION_CACHE_MAX_ENTRIES, SUGGESTION_CACHE_TTL, SUGGESTION_UPSTREAM_CAP, SUGGESTION_DEBOUNCE_MS,
+    SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL,
+    PLAYLIST_PAGE_SIZE, PLAYLIST_FIRST_WINDOW, PLAYLIST_MAX_WINDOW,
+)
+from app.services.extractor import (
+    SEARCH_FLAT, PLAYLIST_FLAT, INFO_TIERS, ExtractionEngine, ExtractionError,
+    extract_flat, extract_video_info, iter_flat,
+)
 from app.enums.video_qualities import VideoQuality
 from app.enums.audio_qualities import AudioQuality
 from app.db.database_manager import db
+from app.utils.single_flight import SingleFlight
+from app.utils.http_client import http_client
+from app.utils.suggestion_cache import SuggestionTrie, SuggestionDebouncer
+from app.utils.search_cache import SearchCache
+from app.utils.format_index import FormatIndex, format_size
+from app.utils.download_scheduler import percentile
 
 headers_list = [
     # Chrome (Windows)
@@ -106,6 +125,14 @@ headers_list = [
     },
 ]
 
+class _PlaylistLoad:
+    """Background loader of one playlist's entries and the latest metadata it stored."""
+
+    def __init__(self, playlist: dict[str, any]) -> None:
+        self.playlist = playlist
+        self.progress = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
 class YoutubeService:
     """
     YouTube service for handling video/audio downloads, searches, and metadata extraction.
@@ -118,21 +145,76 @@ class YoutubeService:
     """
     
     def __init__(self) -> None:
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+        self._engine = ExtractionEngine(EXTRACTION_BACKEND, EXTRACTION_WORKERS)
+        # Concurrent cache misses for the same video share one extraction
+        self._video_info_flight = SingleFlight()
+        # Autocomplete: prefix trie cache, per-client debounce, one upstream call per query
+        self._suggestion_trie = SuggestionTrie(SUGGESTION_CACHE_MAX_ENTRIES, SUGGESTION_CACHE_TTL, SUGGESTION_UPSTREAM_CAP)
+        self._suggestion_debouncer = SuggestionDebouncer(SUGGESTION_DEBOUNCE_MS / 1000)
+        self._suggestion_flight = SingleFlight()
+        self._suggestion_requests = 0
+        self._suggestion_upstream_calls = 0
+        # Search results keyed by normalized query, served stale while refreshing
+        self._search_cache = SearchCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL)
+        # Video info extraction tiers: runs, recent latencies and escalations past the fast tier
+        self._tier_runs = {profile: 0 for profile in INFO_TIERS}
+        self._tier_latency = {profile: deque(maxlen=1000) for profile in INFO_TIERS}
+        self._tier_escalations = {profile: 0 for profile in INFO_TIERS}
+        self._tiered_extractions = 0
+        # Playlists: one first-window extraction per cache miss, then a background loader each
+        self._playlist_flight = SingleFlight()
+        self._playlist_loads: dict[str, _PlaylistLoad] = {}
     
-    async def get_suggestions(self, q: str) -> dict[str, str | list[str]]:
+    async def get_suggestions(self, q: str, client_id: str | None = None) -> dict[str, str | list[str]]:
         """
-        Get search suggestions from Google/YouTube.
+        Get search suggestions, served from the local prefix cache when possible.
         
         Args:
             q: Search query string
+            client_id: Requesting client, used to collapse bursts of keystrokes
             
         Returns:
             dictionary containing query and suggestions or error message
         """
         if not q or not q.strip():
             return {"error": "Query parameter is required"}
+
+        self._suggestion_requests += 1
+        normalized = " ".join(q.casefold().split())
+        cached = self._suggestion_trie.get(normalized)
+        if cached is not None:
+            return {"query": q, "suggestions": cached}
+
+        if client_id:
+            result = await self._suggestion_debouncer.run(client_id, normalized, self._fetch_suggestions)
+        else:
+            result = await self._fetch_suggestions(normalized)
+
+        if "suggestions" in result:
+            return {"query": q, "suggestions": result["suggestions"]}
+        return result
+
+    async def _fetch_suggestions(self, q: str) -> dict[str, str | list[str]]:
+        """Fetch suggestions upstream once per query and cache successful results."""
+        async def fetch_upstream() -> dict[str, str | list[str]]:
+            self._suggestion_upstream_calls += 1
+            result = await self._request_suggestions(q)
+            if "suggestions" in result:
+                self._suggestion_trie.set(q, result["suggestions"])
+            return result
+
+        return await self._suggestion_flight.do(q, fetch_upstream)
+
+    async def _request_suggestions(self, q: str) -> dict[str, str | list[str]]:
+        """
+        Get search suggestions from Google/YouTube.
         
+        Args:
+            q: Search query string
+            
+        Returns:
+            dictionary containing query and suggestions or error message
+        """
         url = f"https://suggestqueries.google.com/complete/search?client=youtube&ds=yt&q={urllib.parse.quote(q)}"
 
         headers = {
@@ -141,24 +223,23 @@ class YoutubeService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                body = response.text
-
-                # Strip JSONP wrapper
-                if body.startswith("window.google.ac.h("):
-                    json_str = body[len("window.google.ac.h("):-1]
-                    parsed = json.loads(json_str)
-                    
-                    if len(parsed) > 1 and isinstance(parsed[1], list):
-                        suggestions = [
-                            item[0] for item in parsed[1] 
-                            if isinstance(item, list) and len(item) > 0
-                        ]
-                        return {"query": parsed[0], "suggestions": suggestions}
+            response = await http_client.get(url, headers=headers)
+            response.raise_for_status()
+            body = response.text
+
+            # Strip JSONP wrapper
+            if body.startswith("window.google.ac.h("):
+                json_str = body[len("window.google.ac.h("):-1]
+                parsed = json.loads(json_str)
+                
+                if len(parsed) > 1 and isinstance(parsed[1], list):
+                    suggestions = [
+                        item[0] for item in parsed[1] 
+                        if isinstance(item, list) and len(item) > 0
+                    ]
+                    return {"query": parsed[0], "suggestions": suggestions}
 
-                return {"error": "Unexpected response format"}
+            return {"error": "Unexpected response format"}
 
         except httpx.TimeoutException:
             logger.error(f"Timeout while fetching suggestions for query: {q}")
@@ -193,38 +274,18 @@ class YoutubeService:
         # Validate max_results
         max_results = max(1, min(max_results, 50))  # Limit between 1-50
 
-        ydl_opts = {
-            "quiet": True,
-            "retries": 3,
-            "extract_flat": True,
-            "forcejson": True,
-            "noplaylist": True,
-            "max_results": max_results
-        }
-        
-        if os.path.exists(COOKIE_PATH):
-            ydl_opts["cookiefile"] = COOKIE_PATH
-            
-        def search_in_thread() -> dict[str, any]:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
+        return await self._search_cache.get_or_fetch(
+            "videos", query, max_results, lambda n: self._search_videos(query, n)
+        )
 
+    async def _search_videos(self, query: str, max_results: int) -> list[dict[str, any]]:
+        """Run a video search with yt-dlp, bypassing the search cache."""
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(self._executor, search_in_thread)
+            info = await self._engine.run(extract_flat, SEARCH_FLAT, f"ytsearch{max_results}:{query}")
             
             data=info.get("entries", [])
             
-            return [{
-                "video_id": d.get("id"),
-                "title": d.get("title"),
-                "video_url": d.get("url"),
-                "description":d.get("description"),
-                "thumbnail": "https://img.youtube.com/vi/"+d.get("id")+"/hqdefault.jpg",
-                "duration": d.get("duration"),
-                "uploader": d.get("uploader"),
-                "upload_date": d.get("upload_date", ""),
-            } for d in data]
+            return [self._video_result(d) for d in data]
 
         except Exception as e:
             logger.error(f"Error searching YouTube videos for query '{query}': {e}")
@@ -250,43 +311,117 @@ class YoutubeService:
         # Validate max_results
         max_results = max(1, min(max_results, 50))  # Limit between 1-50
 
-        ydl_opts = {
-            "quiet": True,
-            "retries": 3,
-            "extract_flat": True,
-            "forcejson": True,
-            "noplaylist": True,
-            "max_results": max_results+10 #To filter out simple videos if any
-        }
-        
-        if os.path.exists(COOKIE_PATH):
-            ydl_opts["cookiefile"] = COOKIE_PATH
-            
-        def search_in_thread() -> dict[str, any]:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(f"ytsearch{max_results+10}:{query} #shorts", download=False)
+        return await self._search_cache.get_or_fetch(
+            "shorts", query, max_results, lambda n: self._search_shorts(query, n)
+        )
 
+    async def _search_shorts(self, query: str, max_results: int) -> list[dict[str, any]]:
+        """Run a shorts search with yt-dlp, bypassing the search cache."""
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(self._executor, search_in_thread)
+            # Fetch extra results to filter out simple videos if any
+            info = await self._engine.run(extract_flat, SEARCH_FLAT, f"ytsearch{max_results+10}:{query} #shorts")
             # Filter out non shorts videos
             shorts = [entry for entry in info.get("entries", []) if "/shorts/" in entry.get("url", "")]
             if len(shorts) > max_results:
                 shorts = shorts[:max_results]            
-            return [{
-                "video_id": d.get("id"),
-                "title": d.get("title"),
-                "video_url": d.get("url"),
-                "description":d.get("description"),
-                "thumbnail": "https://img.youtube.com/vi/"+d.get("id")+"/hqdefault.jpg",
-                "duration": d.get("duration"),
-                "uploader": d.get("uploader"),
-                "upload_date": d.get("upload_date", ""),
-            } for d in shorts]
+            return [self._video_result(d) for d in shorts]
         except Exception as e:
             logger.error(f"Error searching YouTube videos for query '{query}': {e}")
             raise ApiError(status_code=500, message="Failed to search YouTube videos", error_code="SEARCH_ERROR")
 
+    def stream_search_videos(self, query: str, max_results: int = 10) -> AsyncIterator[dict[str, any]]:
+        """
+        Search YouTube videos, yielding each result as yt-dlp produces it.
+        
+        Args:
+            query: Search query string
+            max_results: Maximum number of results to return (default: 10)
+            
+        Returns:
+            Async iterator of video information dictionaries
+            
+        Raises:
+            ApiError: If query is missing, at once; if the search fails, while iterating
+        """
+        if not query or not query.strip():
+            raise ApiError(status_code=400, message="Query parameter is required", error_code="MISSING_QUERY")
+
+        max_results = max(1, min(max_results, 50))  # Limit between 1-50
+        return self._stream_search(
+            "videos", query, max_results, f"ytsearch{max_results}:{query}",
+            lambda n: self._search_videos(query, n),
+        )
+
+    def stream_search_shorts(self, query: str, max_results: int = 10) -> AsyncIterator[dict[str, any]]:
+        """
+        Search YouTube Shorts, yielding each result as yt-dlp produces it.
+        
+        Args:
+            query: Search query string
+            max_results: Maximum number of results to return (default: 10)
+            
+        Returns:
+            Async iterator of video information dictionaries
+            
+        Raises:
+            ApiError: If query is missing, at once; if the search fails, while iterating
+        """
+        if not query or not query.strip():
+            raise ApiError(status_code=400, message="Query parameter is required", error_code="MISSING_QUERY")
+
+        max_results = max(1, min(max_results, 50))  # Limit between 1-50
+        return self._stream_search(
+            "shorts", query, max_results, f"ytsearch{max_results+10}:{query} #shorts",
+            lambda n: self._search_shorts(query, n),
+            keep=lambda entry: "/shorts/" in entry.get("url", ""),
+        )
+
+    async def _stream_search(
+        self,
+        kind: str,
+        query: str,
+        max_results: int,
+        search_url: str,
+        fetch: Callable[[int], Awaitable[list[dict[str, any]]]],
+        keep: Callable[[dict[str, any]], bool] | None = None,
+    ) -> AsyncIterator[dict[str, any]]:
+        """Stream cached results, or stream a search and cache its results once it completes."""
+        cached = self._search_cache.lookup(kind, query, max_results, fetch)
+        if cached is not None:
+            for result in cached:
+                yield result
+            return
+
+        results = []
+        try:
+            # Closing the stream stops the producer once enough results are in or the client left
+            async with contextlib.aclosing(self._engine.stream(iter_flat, SEARCH_FLAT, search_url)) as entries:
+                async for entry in entries:
+                    if keep is not None and not keep(entry):
+                        continue
+                    result = self._video_result(entry)
+                    results.append(result)
+                    yield result
+                    if len(results) >= max_results:
+                        break
+        except ExtractionError as e:
+            logger.error(f"Error streaming YouTube {kind} search for query '{query}': {e}")
+            raise ApiError(status_code=500, message="Failed to search YouTube videos", error_code="SEARCH_ERROR")
+        self._search_cache.store(kind, query, max_results, results)
+
+    def _video_result(self, entry: dict[str, any]) -> dict[str, any]:
+        """Shape a flat search entry as a video search result."""
+        return {
+            "video_id": entry.get("id"),
+            "title": entry.get("title"),
+            "video_url": entry.get("url"),
+            "description":entry.get("description"),
+            "thumbnail": "https://img.youtube.com/vi/"+entry.get("id")+"/hqdefault.jpg",
+            "duration": entry.get("duration"),
+            "uploader": entry.get("uploader"),
+            "upload_date": entry.get("upload_date", ""),
+        }
+
     async def search_playlists(self, query: str, max_results: int = 5) -> list[dict[str, any]]:
         """
         Search for playlists and fetch their full details concurrently.
@@ -307,25 +442,18 @@ class YoutubeService:
         # Validate max_results
         max_results = max(1, min(max_results, 20))  # Limit between 1-20
 
+        return await self._search_cache.get_or_fetch(
+            "playlists", query, max_results, lambda n: self._search_playlists(query, n)
+        )
+
+    async def _search_playlists(self, query: str, max_results: int) -> list[dict[str, any]]:
+        """Run a playlist search with yt-dlp, bypassing the search cache."""
         # Step 1: Perform a fast search to get playlist URLs
         encoded_query = urllib.parse.quote_plus(query)
         search_url = f"https://www.youtube.com/results?search_query={encoded_query}&sp=EgIQAw%3D%3D"
 
-        ydl_opts = {
-            'quiet': True,
-            'retries': 3,
-            'extract_flat': True,
-            'forcejson': True,
-            'playlistend': max_results,
-        }
-
-        def search_for_urls_in_thread() -> dict[str, any]:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(search_url, download=False)
-        
         try:
-            loop = asyncio.get_running_loop()
-            search_result = await loop.run_in_executor(self._executor, search_for_urls_in_thread)
+            search_result = await self._engine.run(extract_flat, SEARCH_FLAT, search_url, {"playlistend": max_results})
             
             if not (search_result and search_result.get('entries')):
                 return []
@@ -371,34 +499,29 @@ class YoutubeService:
             return cached_video
         
         logger.info(f"Cache miss for video ID: {video_id}, fetching from yt-dlp")
+        return await self._video_info_flight.do(video_id, lambda: self._extract_video_info(video_id))
+
+    async def _extract_video_info(self, video_id: str) -> dict[str, any]:
+        """
+        Extract video information with yt-dlp and store it in the cache.
         
-        # Extract video info using yt-dlp
-        ydl_opts = {
-            "skip_download": True,
-            "retries": 3,
-            "forcejson": True,
-            "no_warnings": False,
-            "encoding": "utf-8",
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['all']
-                }
-            }
-        }
+        Only one extraction per video ID runs at a time, see get_video_info.
         
-        if os.path.exists(COOKIE_PATH):
-            ydl_opts["cookiefile"] = COOKIE_PATH
-
+        Args:
+            video_id: YouTube video ID
+            
+        Returns:
+            dictionary containing video information
+            
+        Raises:
+            ApiError: If extraction or storage fails
+        """
+        # Extract video info using yt-dlp
         url = self.get_video_url(video_id)
         logger.info(f"Fetching video info for url: {url}")
 
-        def extract_info_in_thread() -> dict[str, any]:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(url, download=False)
-        
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(self._executor, extract_info_in_thread)
+            info, index = await self._extract_tiered(video_id, url)
             
             # Check for video format availability
             if not info.get("formats"):
@@ -416,12 +539,12 @@ class YoutubeService:
             }
 
             # Process available formats
-            available_formats = info.get("formats", [])
-            audio_qualities = self._extract_audio_qualities(available_formats, video_id)
-            video_qualities = self._extract_video_qualities(available_formats, video_id)
+            audio_qualities = index.audio_qualities()
+            video_qualities = index.video_qualities()
             #Add audio filesize to approx video filesize
+            best_audio = index.best_audio()
             for video in video_qualities:
-                video["filesize"] += audio_qualities[-1]["filesize"] if audio_qualities else 0
+                video["filesize"] += format_size(best_audio) if best_audio else 0
             
             video_info["video_qualities"] = video_qualities
             video_info["audio_qualities"] = audio_qualities
@@ -442,45 +565,130 @@ class YoutubeService:
             logger.error(f"Error extracting video info for {video_id}: {e}")
             raise ApiError(500, "Failed to extract video information", "EXTRACTION_ERROR")
 
-    def _extract_video_qualities(self, available_formats: list[dict[str, any]], video_id: str) -> list[dict[str, any]]:
-        """Extract available video qualities from formats."""
-        video_qualities = []
-        for video_format in VideoQuality.list():
-            matched = next((fmt for fmt in available_formats if video_format in fmt.get("format_note", "")), None)
-            if matched:
-                logger.info(f"Video format {video_format} is available for video ID: {video_id}")
-                video_qualities.append({
-                    "format": video_format,
-                    "filesize": matched.get("filesize", 0),
-                })
+    async def _extract_tiered(self, video_id: str, url: str) -> tuple[dict[str, any], FormatIndex]:
+        """
+        Extract a video with the cheapest profile whose formats are complete.
+        
+        Tries the INFO_TIERS profiles in order, from the fast one asking a
+        few player clients to the one asking all of them, and stops at the
+        first whose FormatIndex has no missing quality tiers. If every tier
+        misses some, the result with the most formats is used.
+        
+        Returns:
+            Tuple of (compact info dictionary, its FormatIndex)
+            
+        Raises:
+            ExtractionError: If every tier fails
+        """
+        self._tiered_extractions += 1
+        best = None
+        error = None
+        for profile in INFO_TIERS:
+            self._tier_runs[profile] += 1
+            started = time.perf_counter()
+            try:
+                info = await self._engine.run(extract_video_info, url, profile)
+            except ExtractionError as e:
+                error = e
+                missing = ["extraction failed"]
             else:
-                logger.warning(f"Video format {video_format} not available for video ID: {video_id}")
-        return video_qualities
-
-    def _extract_audio_qualities(self, available_formats: list[dict[str, any]], video_id: str) -> list[dict[str, any]]:
-        """Extract available audio qualities from formats."""
-        audio_qualities = []
-        for audio_quality in AudioQuality.list():
-            matched = next((fmt for fmt in available_formats if audio_quality in fmt.get("format_note", "")), None)
-            if matched:
-                logger.info(f"Audio quality {audio_quality} is available for video ID: {video_id}")
-                audio_qualities.append({
-                    "format": audio_quality,
-                    "filesize": matched.get("filesize", 0),
-                })
+                index = FormatIndex(info.get("formats") or [])
+                if best is None or index.format_count > best[1].format_count:
+                    best = (info, index)
+                missing = index.missing_tiers()
+            finally:
+                self._tier_latency[profile].append(time.perf_counter() - started)
+
+            if not missing:
+                break
+            if profile != INFO_TIERS[-1]:
+                self._tier_escalations[profile] += 1
+                logger.info(f"Escalating extraction of {video_id} past {profile}, missing {', '.join(missing)}")
+
+        if best is None:
+            raise error
+        logger.info(f"Indexed video ID {video_id}: {best[1].summary()}")
+        return best
+
+    def get_download_options(self, video_id: str, quality: str, audio_only: bool = False, subtitles: bool = False, format_id: str | None = None) -> tuple[str, dict[str, any]]:
+        """
+        Build the cache tag and yt-dlp options of a download.
+        
+        Args:
+            video_id: YouTube video ID
+            quality: A VideoQuality value, or an AudioQuality value if audio_only
+            audio_only: Download an mp3 of the audio track only
+            subtitles: Embed subtitles into the video
+            format_id: yt-dlp format the FormatIndex chose for this quality,
+                tried before the generic selector
+            
+        Returns:
+            Tuple of (cache tag, yt-dlp options). The tag matches the ones
+            get_video marks as cached, e.g. "video_720p" or "audio_high"
+            
+        Raises:
+            ApiError: If quality is invalid
+        """
+        valid = AudioQuality.list() if audio_only else VideoQuality.list()
+        if quality not in valid:
+            raise ApiError(400, f"Invalid quality: {quality}. Valid options are: {', '.join(valid)}", "INVALID_QUALITY")
+
+        if audio_only:
+            tag = f"audio_{quality}"
+            opts = {
+                "format": f"{format_id}/bestaudio[format_note*={quality}]/bestaudio" if format_id else f"bestaudio[format_note*={quality}]/bestaudio",
+                "postprocessors": [{
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                }],
+            }
+        else:
+            tag = f"video_{quality}_subs" if subtitles else f"video_{quality}"
+            if quality == VideoQuality.Premium.value:
+                selector = "bestvideo+bestaudio/best"
             else:
-                logger.warning(f"Audio quality {audio_quality} not available for video ID: {video_id}")
-        return audio_qualities
+                height = quality.rstrip("p")
+                selector = f"bestvideo[height<={height}]+bestaudio/best[height<={height}]"
+            if format_id:
+                selector = f"{format_id}+bestaudio/{selector}"
+            opts = {
+                "format": selector,
+                "merge_output_format": "mp4",
+            }
+            if subtitles:
+                opts.update({
+                    "writesubtitles": True,
+                    "subtitleslangs": ["en.*"],
+                    "postprocessors": [{"key": "FFmpegEmbedSubtitle"}],
+                })
+
+        opts.update({
+            "quiet": True,
+            "noprogress": True,
+            "retries": 3,
+            "noplaylist": True,
+            "outtmpl": os.path.join(DOWNLOADS_DIR, video_id, f"{tag}.%(ext)s"),
+        })
+        if os.path.exists(COOKIE_PATH):
+            opts["cookiefile"] = COOKIE_PATH
+
+        return tag, opts
     
-    async def get_playlist_info(self, playlist_id: str) -> dict[str, any]:
+    async def get_playlist_info(self, playlist_id: str, offset: int = 0, limit: int = PLAYLIST_PAGE_SIZE) -> dict[str, any]:
         """
-        Get playlist information with caching support.
+        Get playlist information and one page of its videos, with caching support.
+        
+        On a cache miss only the first window of entries is extracted before
+        returning; the rest is loaded in the background in growing windows.
+        A page past the loaded entries waits until the loader reaches it.
         
         Args:
             playlist_id: YouTube playlist ID
+            offset: Playlist position (0-based) of the first video to return
+            limit: Number of positions to return
             
         Returns:
-            dictionary containing playlist information or None if not found
+            dictionary containing playlist information and the requested page of videos
             
         Raises:
             ApiError: If playlist_id is invalid or extraction fails
@@ -489,82 +697,175 @@ class YoutubeService:
             raise ApiError(400, "Invalid YouTube playlist ID", "INVALID_ID")
 
         # Check cache first
-        cached_playlist = await db.get_playlist(playlist_id)
-        if cached_playlist:
+        playlist = await db.get_playlist(playlist_id)
+        if playlist and playlist.get("entries_loaded") is None:
+            # Cached before entries were stored apart, the whole list is inline
             logger.info(f"Cache hit for playlist ID: {playlist_id}")
-            return cached_playlist
-        
-        logger.info(f"Cache miss for playlist ID: {playlist_id}, fetching from yt-dlp")
-        
-        # Fetch playlist information using yt-dlp
-        ydl_opts = {
-            "quiet": True,
-            "retries": 3,
-            "extract_flat": True,
-            "dump_single_json": True,
-            "is_playlist": True,
-            "encoding": "utf-8",
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['all']
-                }
+            videos = playlist.get("videos") or []
+            return {
+                **playlist,
+                "videos": videos[offset:offset + limit],
+                "offset": offset,
+                "limit": limit,
+                "entries_loaded": len(videos),
+                "entries_complete": True,
             }
+
+        if playlist:
+            logger.info(f"Cache hit for playlist ID: {playlist_id}")
+            if not playlist["entries_complete"]:
+                # Resume a load interrupted by a restart
+                self._start_playlist_loader(playlist)
+        else:
+            logger.info(f"Cache miss for playlist ID: {playlist_id}, fetching from yt-dlp")
+            playlist = await self._playlist_flight.do(playlist_id, lambda: self._load_playlist(playlist_id))
+
+        if not playlist["entries_complete"] and playlist["entries_loaded"] < offset + limit:
+            playlist = await self._wait_for_entries(playlist, offset + limit)
+
+        entries = await db.get_playlist_entries(playlist_id, offset, limit)
+        return {
+            **playlist,
+            "videos": [self._playlist_video(entry) for entry in entries],
+            "offset": offset,
+            "limit": limit,
         }
-        
-        playlist_url = self.get_playlist_url(playlist_id)
-        
-        def extract_info_in_thread() -> dict[str, any]:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(playlist_url, download=False)
 
+    async def _load_playlist(self, playlist_id: str) -> dict[str, any]:
+        """Extract the playlist metadata and its first window of entries, then start the loader."""
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(self._executor, extract_info_in_thread)
-            
+            info = await self._engine.run(
+                extract_flat, PLAYLIST_FLAT, self.get_playlist_url(playlist_id),
+                {"playlist_items": f"1-{PLAYLIST_FIRST_WINDOW}"},
+            )
+            entries = self._playlist_entries(playlist_id, info.get("entries") or [], 0)
+            await db.store_playlist_entries(entries)
+
+            scanned = len(info.get("entries") or [])
+            complete = scanned < PLAYLIST_FIRST_WINDOW or scanned == info.get("playlist_count")
             playlist_info = {
                 "playlist_id": playlist_id,
                 "title": info.get("title", "Unknown Playlist"),
                 "uploader": info.get("uploader", "Unknown"),
                 "description": info.get("description", ""),
                 "thumbnail": self._extract_thumbnail(info.get("thumbnails", [])),
-                "total_videos": len(info.get("entries", [])),
-                "videos": []
+                "total_videos": info.get("playlist_count") or scanned,
+                "videos": [],
+                "entries_loaded": scanned,
+                "entries_complete": complete,
+                "created_at": datetime.utcnow().isoformat(),
             }
-            
-            # Process playlist videos
-            for idx, entry in enumerate(info.get("entries", [])):
-                if entry:
-                    
-                    video_id = entry.get("id", "")
-                    #Set thumbnail of the first video as playlist thumbnail
-                    if idx==0:
-                        playlist_info["thumbnail"] = "https://img.youtube.com/vi/"+video_id+"/hqdefault.jpg"
-
-                    playlist_info["videos"].append({
-                        "video_id": video_id,
-                        "title": entry.get("title", "Unknown Video"),
-                        "thumbnail": "https://img.youtube.com/vi/"+video_id+"/hqdefault.jpg",
-                        "duration": entry.get("duration", 0),
-                        "uploader": entry.get("uploader", "Unknown"),
-                        "upload_date": entry.get("upload_date", ""),
-                        "description": entry.get("description", "")
-                    })
-                    
+            #Set thumbnail of the first video as playlist thumbnail
+            if entries and entries[0]["position"] == 0:
+                playlist_info["thumbnail"] = entries[0]["thumbnail"]
+
             # Store playlist information in the database
             success = await db.store_playlist_info(playlist_info)
             if not success:
                 logger.error(f"Failed to store playlist information for playlist ID: {playlist_id}")
                 raise ApiError(500, "Failed to store playlist information", "STORAGE_ERROR")
-            
-            logger.info(f"Playlist information stored successfully for playlist ID: {playlist_id}")
+
+            logger.info(f"Stored playlist {playlist_id} with {scanned} of {playlist_info['total_videos']} entries")
+            if not complete:
+                self._start_playlist_loader(playlist_info)
             return playlist_info
-            
+
         except ApiError:
             raise
         except Exception as e:
             logger.error(f"Error extracting playlist info for {playlist_id}: {e}")
             raise ApiError(500, "Failed to extract playlist information", "EXTRACTION_ERROR")
 
+    def _start_playlist_loader(self, playlist: dict[str, any]) -> _PlaylistLoad:
+        """Return the background loader of a playlist, starting one if none is running."""
+        playlist_id = playlist["playlist_id"]
+        load = self._playlist_loads.get(playlist_id)
+        if load is None:
+            load = _PlaylistLoad(playlist)
+            load.task = asyncio.create_task(self._load_playlist_entries(load))
+            load.task.add_done_callback(lambda _: self._playlist_loads.pop(playlist_id, None))
+            self._playlist_loads[playlist_id] = load
+        return load
+
+    async def _load_playlist_entries(self, load: _PlaylistLoad) -> None:
+        """Extract the remaining entries of a playlist, doubling the window each time."""
+        playlist_id = load.playlist["playlist_id"]
+        url = self.get_playlist_url(playlist_id)
+        window = PLAYLIST_FIRST_WINDOW
+        try:
+            while not load.playlist["entries_complete"]:
+                start = load.playlist["entries_loaded"]
+                window = min(window * 2, PLAYLIST_MAX_WINDOW)
+                info = await self._engine.run(
+                    extract_flat, PLAYLIST_FLAT, url, {"playlist_items": f"{start + 1}-{start + window}"},
+                )
+                scanned = len(info.get("entries") or [])
+                await db.store_playlist_entries(self._playlist_entries(playlist_id, info.get("entries") or [], start))
+
+                loaded = start + scanned
+                total = info.get("playlist_count") or load.playlist["total_videos"]
+                complete = scanned < window or loaded >= total
+                load.playlist = {
+                    **load.playlist,
+                    "total_videos": loaded if scanned < window else total,
+                    "entries_loaded": loaded,
+                    "entries_complete": complete,
+                }
+                await db.store_playlist_info(load.playlist)
+                async with load.progress:
+                    load.progress.notify_all()
+            logger.info(f"Loaded all {load.playlist['entries_loaded']} entries of playlist {playlist_id}")
+        except Exception as e:
+            logger.error(f"Error loading entries of playlist {playlist_id} after {load.playlist['entries_loaded']}: {e}")
+        finally:
+            async with load.progress:
+                load.progress.notify_all()
+
+    async def _wait_for_entries(self, playlist: dict[str, any], end: int) -> dict[str, any]:
+        """Wait until a playlist's entries are loaded up to position `end`, or its loader stops."""
+        load = self._start_playlist_loader(playlist)
+        async with load.progress:
+            await load.progress.wait_for(
+                lambda: load.task.done()
+                or load.playlist["entries_complete"]
+                or load.playlist["entries_loaded"] >= end
+            )
+        return load.playlist
+
+    def _playlist_entries(self, playlist_id: str, entries: list[dict[str, any] | None], start: int) -> list[dict[str, any]]:
+        """Build cached_playlist_entries rows of one window; unavailable videos leave gaps."""
+        rows = []
+        for i, entry in enumerate(entries):
+            if not entry:
+                continue
+            video_id = entry.get("id", "")
+            rows.append({
+                "playlist_id": playlist_id,
+                # playlist_index is 1-based and counts unavailable videos
+                "position": (entry.get("playlist_index") or start + i + 1) - 1,
+                "video_id": video_id,
+                "title": entry.get("title", "Unknown Video"),
+                "thumbnail": "https://img.youtube.com/vi/"+video_id+"/hqdefault.jpg",
+                "duration": entry.get("duration", 0),
+                "uploader": entry.get("uploader", "Unknown"),
+                "upload_date": entry.get("upload_date", ""),
+                "description": entry.get("description", ""),
+            })
+        return rows
+
+    def _playlist_video(self, entry: dict[str, any]) -> dict[str, any]:
+        """Shape a cached_playlist_entries row like the videos of a playlist response."""
+        return {
+            "position": entry["position"],
+            "video_id": entry["video_id"],
+            "title": entry.get("title"),
+            "thumbnail": entry.get("thumbnail"),
+            "duration": entry.get("duration"),
+            "uploader": entry.get("uploader"),
+            "upload_date": entry.get("upload_date"),
+            "description": entry.get("description"),
+        }
+
     def _extract_thumbnail(self, thumbnails: list[dict[str, any]]) -> str:
         """Extract the best thumbnail URL from thumbnails list."""
         if not thumbnails or not isinstance(thumbnails, list):
@@ -577,6 +878,57 @@ class YoutubeService:
         
         return ""
 
+    def get_metrics(self) -> dict[str, dict[str, int | float]]:
+        """
+        Get counters of the service's in-process caches and coalescers.
+        
+        Returns:
+            dictionary of counters keyed by component
+        """
+        return {
+            "video_info_flight": self._video_info_flight.stats(),
+            "extraction_engine": self._engine.stats(),
+            "http_client": http_client.stats(),
+            "search_cache": self._search_cache.stats(),
+            "extraction_tiers": self._extraction_tier_stats(),
+            "playlists": {
+                "first_window_flight": self._playlist_flight.stats(),
+                "loaders_running": len(self._playlist_loads),
+            },
+            "suggestions": {
+                "requests": self._suggestion_requests,
+                "upstream_calls": self._suggestion_upstream_calls,
+                "upstream_calls_saved": self._suggestion_requests - self._suggestion_upstream_calls,
+                "cache": self._suggestion_trie.stats(),
+                "debounce": self._suggestion_debouncer.stats(),
+            },
+        }
+
+    def _extraction_tier_stats(self) -> dict[str, any]:
+        tiers = {}
+        for profile in INFO_TIERS:
+            samples = list(self._tier_latency[profile])
+            runs = self._tier_runs[profile]
+            tiers[profile] = {
+                "runs": runs,
+                "escalations": self._tier_escalations[profile],
+                "escalation_rate": round(self._tier_escalations[profile] / runs, 4) if runs else 0.0,
+                "latency_p50": round(percentile(samples, 50), 3),
+                "latency_p90": round(percentile(samples, 90), 3),
+                "latency_p99": round(percentile(samples, 99), 3),
+            }
+        return {"extractions": self._tiered_extractions, "tiers": tiers}
+
+    async def startup(self) -> None:
+        """Start the extraction engine and warm its YoutubeDL pools."""
+        await self._engine.start()
+
+    def shutdown(self) -> None:
+        """Stop the playlist loaders and the extraction engine."""
+        for load in list(self._playlist_loads.values()):
+            load.task.cancel()
+        self._engine.shutdown()
+
     def get_video_url(self, video_id: str) -> str:
         """
         Returns the YouTube video URL based on the video ID.
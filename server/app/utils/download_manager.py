@@ -1,71 +1,244 @@
 import asyncio
-import random
+import concurrent.futures
+import os
+import time
+import uuid
+from typing import Awaitable, Callable
+from app.config import DOWNLOAD_WORKERS, DOWNLOAD_JOB_RETENTION, DOWNLOAD_CLASS_WEIGHTS, DOWNLOAD_AGING_RATE
 from app.logger import logger
-from app.config import COOKIE_PATH
+from app.utils.download_scheduler import DownloadScheduler
 from yt_dlp import YoutubeDL
-import functools
+
+
+class DownloadJob:
+    """
+    State of one queued download, shared with everyone watching its progress.
+    """
+
+    # Minimum seconds between two published progress updates
+    PUBLISH_INTERVAL = 0.5
+
+    def __init__(self, video_id: str, url: str, quality_tag: str, ydl_opts: dict[str, any], title: str | None = None):
+        self.id = uuid.uuid4().hex
+        self.video_id = video_id
+        self.url = url
+        self.quality_tag = quality_tag
+        self.ydl_opts = ydl_opts
+        self.title = title
+        self.status = "queued"  # queued | downloading | processing | completed | failed
+        self.progress: dict[str, any] = {}
+        self.filepath: str | None = None
+        self.filesize: int | None = None
+        self.vcodec: str | None = None
+        self.acodec: str | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.requesters: set[str] = set()
+        self.fan_out = 1  # Requests served by this one download
+        self.priority_class: str | None = None
+        self.callbacks: list[Callable[["DownloadJob"], Awaitable[None]]] = []
+        self._subscribers: set[asyncio.Queue] = set()
+        self._done = asyncio.Event()
+        self._last_publish = 0.0
+
+    @property
+    def download_id(self) -> str:
+        return f"{self.video_id}_{self.quality_tag}"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def snapshot(self) -> dict[str, any]:
+        """Return the job state as a JSON-serializable dictionary."""
+        return {
+            "job_id": self.id,
+            "video_id": self.video_id,
+            "quality_tag": self.quality_tag,
+            "status": self.status,
+            "fan_out": self.fan_out,
+            "priority_class": self.priority_class,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue receiving a snapshot on every progress update."""
+        queue = asyncio.Queue(maxsize=16)
+        queue.put_nowait(self.snapshot())
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def _publish(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_publish < self.PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        snapshot = self.snapshot()
+        for queue in self._subscribers:
+            if queue.full():
+                # Slow consumer: drop the oldest update, the newest one matters
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    def update_progress(self, status: str, progress: dict[str, any]) -> None:
+        changed = status != self.status
+        self.status = status
+        self.progress.update(progress)
+        self._publish(force=changed)
+
+    def finish(self, status: str, error: str | None = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._done.set()
+        self._publish(force=True)
+
+    async def wait(self) -> None:
+        """Wait until the job has completed or failed."""
+        await self._done.wait()
 
 
 class DownloadManager:
     """
     Manages asynchronous downloading of files with concurrency control,
-    a work queue, and duplicate prevention.
+    a fair-share work queue, and duplicate coalescing.
+
+    Every download is tracked as a DownloadJob that callers can poll or
+    subscribe to, so no HTTP request has to stay open while yt-dlp runs.
+    Requests for a video/quality that is already downloading attach to the
+    in-flight job and share its progress and result. Queued jobs are
+    served by a DownloadScheduler, weighted by plan class and fair across
+    users, instead of first come first served.
+    Throughput is bounded by max_workers, each worker running one yt-dlp
+    download on the manager's own thread pool.
     """
 
-    def __init__(self, max_workers = 10):
+    def __init__(self, max_workers = 10, job_retention: float = 3600, class_weights: dict[str, float] | None = None, aging_rate: float = 0.05):
         if max_workers <= 0:
             raise ValueError("max_workers must be a positive integer")
 
         self.max_workers = max_workers
-        self.queue = asyncio.Queue()
+        self.job_retention = job_retention
+        self.queue = DownloadScheduler(class_weights or {"default": 1}, aging_rate)
         self.semaphore = asyncio.Semaphore(self.max_workers)
-        self.active_downloads = set()
+        self.active_downloads: dict[str, DownloadJob] = {}
+        self.jobs: dict[str, DownloadJob] = {}
         self.workers = []
+        self.listeners: list[Callable[[DownloadJob], Awaitable[None]]] = []
+        self._executor = None
         self._running = False
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.max_fan_out = 0
+        self.bytes_saved = 0
         logger.info(f"DownloadManager initialized with {self.max_workers} max workers.")
 
-    async def _download_file(self, task_details):
+    def _progress_hook(self, job: DownloadJob, loop: asyncio.AbstractEventLoop):
+        """Build a yt-dlp progress hook forwarding updates to the event loop."""
+        def hook(d: dict[str, any]) -> None:
+            if d.get("status") != "downloading":
+                return
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            downloaded = d.get("downloaded_bytes") or 0
+            progress = {
+                "downloaded_bytes": downloaded,
+                "total_bytes": total,
+                "percent": round(downloaded / total * 100, 1) if total else None,
+                "speed": d.get("speed"),
+                "eta": d.get("eta"),
+            }
+            loop.call_soon_threadsafe(job.update_progress, "downloading", progress)
+        return hook
+
+    def _postprocessor_hook(self, job: DownloadJob, loop: asyncio.AbstractEventLoop):
+        """Build a yt-dlp postprocessor hook marking the merge/convert stage."""
+        def hook(d: dict[str, any]) -> None:
+            if d.get("status") == "started":
+                loop.call_soon_threadsafe(job.update_progress, "processing", {"postprocessor": d.get("postprocessor")})
+        return hook
+
+    async def _download_file(self, job: DownloadJob):
         """
         Actual YT-DLP downloader, running the blocking call in a thread executor.
         """
-        video_id = task_details['video_id']
-        url = task_details['url']
-        quality = task_details['quality_tag']
-        opts = task_details['ydl_opts']
-        download_id = f"{video_id}_{quality}"
+        download_id = job.download_id
 
         logger.info(f"Starting download for: {download_id}")
-        logger.debug(f"yt-dlp options for {video_id}: {opts}")
-        
+        logger.debug(f"yt-dlp options for {job.video_id}: {job.ydl_opts}")
+
         try:
             # Get the current asyncio event loop
             loop = asyncio.get_running_loop()
 
-            # Use functools.partial to prepare the blocking function call
-            with YoutubeDL(opts) as ydl:
-                blocking_call = functools.partial(ydl.download, [url])
-                
-                # Run the blocking ydl.download call in a separate thread pool (the default executor)
-                # This prevents it from blocking the main asyncio event loop.
-                await loop.run_in_executor(None, blocking_call)
-            
+            opts = dict(job.ydl_opts)
+            opts["progress_hooks"] = [*opts.get("progress_hooks", []), self._progress_hook(job, loop)]
+            opts["postprocessor_hooks"] = [*opts.get("postprocessor_hooks", []), self._postprocessor_hook(job, loop)]
+
+            def download_in_thread() -> dict[str, any]:
+                with YoutubeDL(opts) as ydl:
+                    return ydl.extract_info(job.url, download=True)
+
+            # Run the blocking download on the manager's pool so it never blocks the event loop
+            job.update_progress("downloading", {})
+            info = await loop.run_in_executor(self._executor, download_in_thread)
+
+            downloaded = (info.get("requested_downloads") or [info])[-1]
+            job.filepath = downloaded.get("filepath") or downloaded.get("_filename")
+            if not job.filepath or not os.path.exists(job.filepath):
+                raise FileNotFoundError(f"Downloaded file not found for {download_id}")
+            job.filesize = os.path.getsize(job.filepath)
+            job.vcodec = downloaded.get("vcodec")
+            job.acodec = downloaded.get("acodec")
+
+            job.finish("completed")
+            self.completed += 1
+            # Every attached request is a download we did not have to repeat
+            self.bytes_saved += job.filesize * (job.fan_out - 1)
             logger.info(f"Finished download for: {download_id}")
 
         except Exception as e:
             logger.error(f"Error downloading {download_id}: {e}")
+            job.finish("failed", str(e))
+            self.failed += 1
         finally:
             # This is the "unlock" step.
-            if download_id in self.active_downloads:
-                self.active_downloads.remove(download_id)
+            if self.active_downloads.get(download_id) is job:
+                del self.active_downloads[download_id]
                 logger.debug(f"Released lock for: {download_id}")
 
+        await self._run_callbacks(job)
+
+    def add_listener(self, callback: Callable[[DownloadJob], Awaitable[None]]) -> None:
+        """
+        Register a coroutine function called once for every finished job.
+
+        Listeners run before the per-request on_complete callbacks, however
+        many requests share the job.
+        """
+        self.listeners.append(callback)
+
+    async def _run_callbacks(self, job: DownloadJob) -> None:
+        for callback in [*self.listeners, *job.callbacks]:
+            try:
+                await callback(job)
+            except Exception as e:
+                logger.error(f"Download callback failed for {job.download_id}: {e}")
+
     async def _worker(self, worker_id):
         logger.info(f"Worker-{worker_id} started.")
         while self._running:
             try:
-                task_details = await self.queue.get()
+                job = await self.queue.get()
                 async with self.semaphore:
-                    await self._download_file(task_details)
+                    await self._download_file(job)
                 self.queue.task_done()
             except asyncio.CancelledError:
                 logger.info(f"Worker-{worker_id} is shutting down.")
@@ -77,85 +250,137 @@ class DownloadManager:
         if self._running:
             return
         self._running = True
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
         self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
         logger.info("DownloadManager started.")
 
-    async def shutdown(self):
+    async def shutdown(self, wait: bool = True):
+        """
+        Stop the workers.
+
+        Args:
+            wait: Finish every queued download first; otherwise stop right away
+        """
         if not self._running:
             return
         logger.info("Shutting down...")
-        await self.queue.join()
+        if wait:
+            await self.queue.join()
         self._running = False
         for worker in self.workers:
             worker.cancel()
         await asyncio.gather(*self.workers, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
         logger.info("DownloadManager shut down.")
 
-    def add_download(self, video_id, url, quality_tag, ydl_opts, progress_hook=None):
+    def _prune_jobs(self) -> None:
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.job_retention
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get_job(self, job_id: str) -> DownloadJob | None:
+        """Return a tracked job by ID."""
+        return self.jobs.get(job_id)
+
+    def add_completed(self, video_id: str, quality_tag: str, filepath: str, title: str | None = None) -> str:
+        """
+        Register an already cached file as a completed job.
+
+        Lets cache hits be served through the same job API as fresh downloads.
+
+        Returns:
+            The job ID
+        """
+        self._prune_jobs()
+        job = DownloadJob(video_id, "", quality_tag, {}, title)
+        job.filepath = filepath
+        job.filesize = os.path.getsize(filepath)
+        job.finish("completed")
+        self.jobs[job.id] = job
+        return job.id
+
+    def add_download(
+        self,
+        video_id,
+        url,
+        quality_tag,
+        ydl_opts,
+        progress_hook=None,
+        title: str | None = None,
+        user_id: str | None = None,
+        priority_class: str | None = None,
+        on_complete: Callable[[DownloadJob], Awaitable[None]] | None = None,
+    ) -> str | None:
+        """
+        Queue a download, or attach to the identical one already in flight.
+
+        Args:
+            video_id: YouTube video ID
+            url: URL passed to yt-dlp
+            quality_tag: Cache tag of the requested format, e.g. "video_720p"
+            ydl_opts: yt-dlp options for the download
+            progress_hook: Extra yt-dlp progress hook
+            title: Title used for the served file name
+            user_id: Requesting user, the unit of fair sharing
+            priority_class: Scheduler class, e.g. from plan_priority_class()
+            on_complete: Coroutine function called with the job once it finished,
+                also when the request was attached to an in-flight job
+
+        Returns:
+            The job ID, or None if the manager is not running
+        """
         if not self._running:
             logger.error("Manager is not running. Call start() first.")
-            return False
+            return None
 
         download_id = f"{video_id}_{quality_tag}"
 
-        if download_id in self.active_downloads:
-            logger.warning(f"Duplicate download ignored: {download_id}")
-            return False
-        
-        self.active_downloads.add(download_id)
-        
+        job = self.active_downloads.get(download_id)
+        if job is not None:
+            if on_complete:
+                job.callbacks.append(on_complete)
+            job.fan_out += 1
+            self.coalesced += 1
+            self.max_fan_out = max(self.max_fan_out, job.fan_out)
+            logger.info(f"Attached to in-flight download: {download_id} (job {job.id}, fan-out {job.fan_out})")
+            return job.id
+
         if progress_hook:
             ydl_opts.setdefault('progress_hooks', []).append(progress_hook)
 
-        task_details = {
-            "video_id": video_id,
-            "url": url,
-            "quality_tag": quality_tag,
-            "ydl_opts": ydl_opts
-        }
-        
-        self.queue.put_nowait(task_details)
-        logger.info(f"Queued download: {download_id}")
-        return True
-
-# --- Corrected Test Script ---
-async def main():
-    download_manager = DownloadManager(max_workers=3)
-    download_manager.start()
-
-    tasks = [
-        {
-            "video_id": "BwfjneL67ZU", "url": "https://www.youtube.com/watch?v=BwfjneL67ZU",
-            "quality_tag": "1080p", "ydl_opts": {"format": "bestvideo[height<=1080]+bestaudio/best"}
-        },
-        {
-            "video_id": "BwfjneL67ZU", "url": "https://www.youtube.com/watch?v=BwfjneL67ZU",
-            "quality_tag": "1080p", "ydl_opts": {"format": "bestvideo[height<=1080]+bestaudio/best"} # This one will now be correctly ignored
-        },
-        {
-            "video_id": "BwfjneL67ZU", "url": "https://www.youtube.com/watch?v=BwfjneL67ZU",
-            "quality_tag": "720p", "ydl_opts": {"format": "bestvideo[height<=720]+bestaudio/best"} # This will now be added
-        },
-        {
-            "video_id": "YDDjAE13oKw", "url": "https://www.youtube.com/watch?v=YDDjAE13oKw",
-            "quality_tag": "480p", "ydl_opts": {"format": "bestvideo[height<=480]+bestaudio/best"}
-        },
-        {
-            "video_id": "YDDjAE13oKw", "url": "https://www.youtube.com/watch?v=YDDjAE13oKw",
-            "quality_tag": "medium", "ydl_opts": {"format": "bestaudio[abr<128]"} # This will also be added
+        self._prune_jobs()
+        job = DownloadJob(video_id, url, quality_tag, ydl_opts, title)
+        if on_complete:
+            job.callbacks.append(on_complete)
+
+        self.active_downloads[download_id] = job
+        self.jobs[job.id] = job
+        job.priority_class = self.queue.put_nowait(job, user_id or download_id, priority_class)
+        logger.info(f"Queued download: {download_id} (job {job.id}, class {job.priority_class})")
+        return job.id
+
+    def stats(self) -> dict[str, any]:
+        """Return queue depth, job counters and how many downloads coalescing saved."""
+        return {
+            "workers": self.max_workers,
+            "queued": self.queue.qsize(),
+            "active": len(self.active_downloads),
+            "tracked_jobs": len(self.jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "max_fan_out": self.max_fan_out,
+            "bytes_saved": self.bytes_saved,
+            "classes": self.queue.stats(),
         }
-    ]
-
-    for i in tasks:
-        download_manager.add_download(
-            video_id=i["video_id"],
-            url=i["url"],
-            quality_tag=i["quality_tag"],
-            ydl_opts=i["ydl_opts"]
-        )
-    
-    # Let the manager run until all tasks are complete
-    await download_manager.shutdown()
-
-if __name__ == "__main__":
-    asyncio.run(main())
+
+
+# Global download manager instance, started by the FastAPI lifespan
+download_manager = DownloadManager(
+    max_workers=DOWNLOAD_WORKERS,
+    job_retention=DOWNLOAD_JOB_RETENTION,
+    class_weights=DOWNLOAD_CLASS_WEIGHTS,
+    aging_rate=DOWNLOAD_AGING_RATE,
+)
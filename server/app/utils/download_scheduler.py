@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples, 0.0 if empty."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class DownloadScheduler:
+    """
+    Weighted fair queue of download jobs, drop-in for the manager's asyncio.Queue.
+
+    Each user is a flow. A job gets a virtual finish tag of
+    max(virtual clock, user's last tag) + 1 / class weight, and jobs are
+    served in tag order, so a user with 200 queued jobs is interleaved with
+    everyone else instead of blocking them, and a class with twice the
+    weight gets twice the share. Aging subtracts `aging_rate` virtual units
+    per second waited; as every job ages at the same rate the effective
+    order is fixed at enqueue time (tag + aging_rate * enqueued_at), which
+    keeps it a plain heap and guarantees no job waits forever.
+    """
+
+    def __init__(self, weights: dict[str, float], aging_rate: float = 0.1, default_class: str | None = None, samples: int = 1000) -> None:
+        if not weights or any(weight <= 0 for weight in weights.values()):
+            raise ValueError("weights must map every class to a positive number")
+
+        self.weights = weights
+        self.aging_rate = aging_rate
+        self.default_class = default_class or min(weights, key=weights.get)
+        self._heap: list[tuple[float, int, any]] = []
+        self._order = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag: dict[str, float] = {}
+        self._waits = {name: deque(maxlen=samples) for name in weights}
+        self._enqueued = {name: 0 for name in weights}
+        self._available = asyncio.Semaphore(0)
+        self._unfinished = 0
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+
+    def put_nowait(self, item: any, flow: str, priority_class: str | None = None) -> str:
+        """
+        Queue an item.
+
+        Args:
+            item: Item to schedule, e.g. a DownloadJob
+            flow: Fairness key, e.g. the user ID
+            priority_class: One of the weighted classes (default: the lowest)
+
+        Returns:
+            The priority class the item was queued under
+        """
+        if priority_class not in self.weights:
+            priority_class = self.default_class
+
+        now = time.monotonic()
+        start = max(self._virtual_time, self._last_tag.get(flow, 0.0))
+        tag = start + 1 / self.weights[priority_class]
+        self._last_tag[flow] = tag
+
+        entry = (tag + self.aging_rate * now, next(self._order), (item, flow, priority_class, start, now))
+        heapq.heappush(self._heap, entry)
+        self._enqueued[priority_class] += 1
+        self._unfinished += 1
+        self._all_done.clear()
+        self._available.release()
+        return priority_class
+
+    async def get(self) -> any:
+        """Wait for and return the next item in fair-share order."""
+        await self._available.acquire()
+        _, _, (item, flow, priority_class, start, enqueued_at) = heapq.heappop(self._heap)
+
+        self._virtual_time = max(self._virtual_time, start)
+        if not self._heap:
+            # Idle: forget old tags so returning users start level with everyone
+            self._last_tag.clear()
+        self._waits[priority_class].append(time.monotonic() - enqueued_at)
+        return item
+
+    def task_done(self) -> None:
+        """Mark an item returned by get() as processed."""
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._all_done.set()
+
+    async def join(self) -> None:
+        """Wait until every queued item has been processed."""
+        await self._all_done.wait()
+
+    def qsize(self) -> int:
+        return len(self._heap)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Get queue-wait percentiles per priority class.
+
+        Returns:
+            dictionary keyed by class with weight, jobs queued and waiting,
+            and p50/p90/p99 queue wait in seconds over the recent samples
+        """
+        waiting = {name: 0 for name in self.weights}
+        for _, _, (_, _, priority_class, _, _) in self._heap:
+            waiting[priority_class] += 1
+
+        result = {}
+        for name, weight in self.weights.items():
+            samples = list(self._waits[name])
+            result[name] = {
+                "weight": weight,
+                "enqueued": self._enqueued[name],
+                "waiting": waiting[name],
+                "wait_p50": round(percentile(samples, 50), 3),
+                "wait_p90": round(percentile(samples, 90), 3),
+                "wait_p99": round(percentile(samples, 99), 3),
+            }
+        return result
+
+
+def plan_priority_class(user_plan: dict[str, any] | None, premium_qualities: tuple[str, ...] = ("1440p", "2160p", "Premium")) -> str:
+    """
+    Derive the download priority class of a user plan.
+
+    Args:
+        user_plan: User plan row joined with its pricing plan
+        premium_qualities: max_video_quality values that make a paid plan premium
+
+    Returns:
+        "premium", "paid" or "free"
+    """
+    if not user_plan or not user_plan.get("price_inr"):
+        return "free"
+    if user_plan.get("max_video_quality") in premium_qualities:
+        return "premium"
+    return "paid"
@@ -0,0 +1,153 @@
+import re
+from app.enums.video_qualities import VideoQuality
+from app.enums.audio_qualities import AudioQuality
+
+VIDEO_QUALITIES = VideoQuality.list()
+AUDIO_QUALITIES = AudioQuality.list()
+_VIDEO_SET = set(VIDEO_QUALITIES)
+_NOTE_HEIGHT = re.compile(r"^(\d{3,4})p")
+
+# Codec preference, higher is better, matching yt-dlp's default ordering
+_VIDEO_CODECS = {"av01": 3, "vp09": 2, "vp9": 2, "avc1": 1, "h264": 1}
+_AUDIO_CODECS = {"opus": 2, "mp4a": 1}
+
+
+def _has_codec(codec: str | None) -> bool:
+    return bool(codec) and codec != "none"
+
+
+def _codec_rank(codec: str, ranks: dict[str, int]) -> int:
+    return ranks.get(codec.split(".")[0], 0)
+
+
+def format_size(fmt: dict[str, any]) -> int:
+    """Exact filesize of a format, else yt-dlp's estimate, else 0."""
+    return fmt.get("filesize") or fmt.get("filesize_approx") or 0
+
+
+def video_bucket(fmt: dict[str, any]) -> str | None:
+    """VideoQuality value of a video-only or muxed format, None if it matches none."""
+    note = fmt.get("format_note") or ""
+    if VideoQuality.Premium.value in note:
+        return VideoQuality.Premium.value
+    # format_note holds the nominal quality, e.g. "1080p" for a 1920x800 or vertical 1080x1920 video
+    match = _NOTE_HEIGHT.match(note)
+    height = int(match.group(1)) if match else fmt.get("height")
+    quality = f"{height}p" if height else None
+    return quality if quality in _VIDEO_SET else None
+
+
+def audio_bucket(fmt: dict[str, any]) -> str | None:
+    """AudioQuality value of an audio-only format, from its format_note or bitrate."""
+    note = (fmt.get("format_note") or "").lower()
+    for quality in AUDIO_QUALITIES:
+        if quality in note:
+            return quality
+    abr = fmt.get("abr")
+    if not abr:
+        return None
+    if abr < 96:
+        return AudioQuality.LOW.value
+    if abr < 192:
+        return AudioQuality.MEDIUM.value
+    return AudioQuality.HIGH.value
+
+
+class FormatIndex:
+    """
+    yt-dlp formats of one video bucketed by quality in a single pass.
+
+    Every format is looked at once: video formats go to the VideoQuality
+    bucket of their nominal height ("Premium" by format_note) and audio-only
+    formats to the AudioQuality bucket of their format_note or bitrate. A
+    bucket keeps its best candidate by codec, then bitrate, then size.
+
+    Attributes:
+        video: VideoQuality value to the chosen format
+        audio: AudioQuality value to the chosen format
+    """
+
+    def __init__(self, formats: list[dict[str, any]]) -> None:
+        self.video: dict[str, dict[str, any]] = {}
+        self.audio: dict[str, dict[str, any]] = {}
+        self.format_count = 0
+
+        video_keys: dict[str, tuple] = {}
+        audio_keys: dict[str, tuple] = {}
+        for fmt in formats:
+            self.format_count += 1
+            vcodec, acodec = fmt.get("vcodec"), fmt.get("acodec")
+            if _has_codec(vcodec):
+                bucket = video_bucket(fmt)
+                if bucket is None:
+                    continue
+                key = (_codec_rank(vcodec, _VIDEO_CODECS), fmt.get("tbr") or 0, format_size(fmt))
+                if bucket not in video_keys or key > video_keys[bucket]:
+                    video_keys[bucket] = key
+                    self.video[bucket] = fmt
+            elif _has_codec(acodec):
+                bucket = audio_bucket(fmt)
+                if bucket is None:
+                    continue
+                key = (_codec_rank(acodec, _AUDIO_CODECS), fmt.get("abr") or 0, format_size(fmt))
+                if bucket not in audio_keys or key > audio_keys[bucket]:
+                    audio_keys[bucket] = key
+                    self.audio[bucket] = fmt
+
+    def best_audio(self) -> dict[str, any] | None:
+        """The chosen format of the highest available audio quality."""
+        for quality in reversed(AUDIO_QUALITIES):
+            if quality in self.audio:
+                return self.audio[quality]
+        return None
+
+    def video_qualities(self) -> list[dict[str, any]]:
+        """
+        Available video qualities in VideoQuality order, as stored in cached_info.
+
+        format_id is set for video-only formats, which the download path
+        pins before its generic selector; muxed formats leave it None.
+        """
+        qualities = []
+        for quality in VIDEO_QUALITIES:
+            fmt = self.video.get(quality)
+            if fmt is not None:
+                qualities.append({
+                    "format": quality,
+                    "filesize": format_size(fmt),
+                    "format_id": None if _has_codec(fmt.get("acodec")) else fmt.get("format_id"),
+                })
+        return qualities
+
+    def audio_qualities(self) -> list[dict[str, any]]:
+        """Available audio qualities in AudioQuality order, as stored in cached_info."""
+        return [
+            {"format": quality, "filesize": format_size(self.audio[quality]), "format_id": self.audio[quality].get("format_id")}
+            for quality in AUDIO_QUALITIES if quality in self.audio
+        ]
+
+    def missing_tiers(self) -> list[str]:
+        """
+        Quality tiers a complete extraction would be expected to have.
+
+        YouTube encodes the whole ladder up to a video's top resolution, so
+        a gap below the highest video quality found, no video at all or no
+        audio-only format means a player client returned a partial list.
+
+        Returns:
+            Missing quality names, e.g. ["480p", "audio"]; empty if complete
+        """
+        ladder = [quality for quality in VIDEO_QUALITIES if quality != VideoQuality.Premium.value]
+        found = [i for i, quality in enumerate(ladder) if quality in self.video]
+        missing = ladder[:found[-1]] if found else ["video"]
+        missing = [quality for quality in missing if quality not in self.video]
+        if not self.audio:
+            missing.append("audio")
+        return missing
+
+    def summary(self) -> str:
+        """One line description of the index for logging."""
+        return (
+            f"{self.format_count} formats, video {'/'.join(q for q in VIDEO_QUALITIES if q in self.video) or 'none'}, "
+            f"audio {'/'.join(q for q in AUDIO_QUALITIES if q in self.audio) or 'none'}"
+        )
@@ -0,0 +1,98 @@
+import importlib.util
+import httpx
+from app.logger import logger
+
+
+class SharedHttpClient:
+    """
+    Process-wide httpx.AsyncClient with a keep-alive connection pool.
+
+    One client is shared by every request so upstream calls reuse warm
+    TCP/TLS connections instead of handshaking each time. HTTP/2 is used
+    when the `h2` package is installed. Started and closed by the FastAPI
+    lifespan; if used before start() it creates the client lazily.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+    ) -> None:
+        self._timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.connections_opened = 0
+        self.http2_requests = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self.http2,
+            )
+            logger.info(f"Shared HTTP client started (http2={self.http2})")
+        return self._client
+
+    async def start(self) -> None:
+        """Create the client and its connection pool."""
+        _ = self.client
+
+    async def aclose(self) -> None:
+        """Close the client and every pooled connection."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Shared HTTP client closed")
+
+    async def _trace(self, event_name: str, info: dict[str, any]) -> None:
+        # A new TCP connection means the pool had nothing reusable for this origin
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def get(self, url: str, **kwargs: any) -> httpx.Response:
+        """
+        Send a GET request over the shared pool.
+
+        Args:
+            url: Request URL
+            **kwargs: Passed through to httpx.AsyncClient.get
+
+        Returns:
+            The httpx response
+        """
+        self.requests += 1
+        response = await self.client.get(url, extensions={"trace": self._trace}, **kwargs)
+        if response.http_version == "HTTP/2":
+            self.http2_requests += 1
+        return response
+
+    def stats(self) -> dict[str, int | float | bool]:
+        """
+        Get connection reuse counters.
+
+        Returns:
+            dictionary with requests sent, connections opened and reused
+        """
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "http2_enabled": self.http2,
+            "requests": self.requests,
+            "http2_requests": self.http2_requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+# Shared client for upstream calls such as search suggestions
+http_client = SharedHttpClient()
@@ -0,0 +1,180 @@
+import asyncio
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from app.logger import logger
+from app.utils.single_flight import SingleFlight
+
+
+def normalize_query(query: str) -> str:
+    """Fold unicode forms, case and whitespace so equivalent queries share a key."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class _SearchEntry:
+    __slots__ = ("max_results", "results", "fresh_until", "stale_until")
+
+    def __init__(self, max_results: int, results: list[dict[str, any]], ttl: float, stale_ttl: float) -> None:
+        now = time.monotonic()
+        self.max_results = max_results
+        self.results = results
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale_ttl
+
+
+class SearchCache:
+    """
+    LRU cache of search results keyed by (kind, normalized query).
+
+    An entry fetched with max_results=50 also serves any later request for
+    fewer results. Entries are fresh for `ttl` seconds; for `stale_ttl`
+    seconds after that they are still served instantly while one background
+    fetch refreshes them (stale-while-revalidate). Concurrent misses for the
+    same key share one fetch.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 900, stale_ttl: float = 3600) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: OrderedDict[tuple[str, str], _SearchEntry] = OrderedDict()
+        self._flight = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+        self.hits = 0
+        self.superset_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    async def get_or_fetch(
+        self,
+        kind: str,
+        query: str,
+        max_results: int,
+        fetch: Callable[[int], Awaitable[list[dict[str, any]]]],
+    ) -> list[dict[str, any]]:
+        """
+        Return cached results, fetching them on a miss.
+
+        Args:
+            kind: Result kind, e.g. "videos", "shorts" or "playlists"
+            query: Raw search query
+            max_results: Number of results requested
+            fetch: Coroutine function taking a result count and running the search
+
+        Returns:
+            list of at most max_results results
+        """
+        results = self.lookup(kind, query, max_results, fetch)
+        if results is not None:
+            return results
+        key = (kind, normalize_query(query))
+        return await self._flight.do((key, max_results), lambda: self._fetch(key, max_results, fetch))
+
+    def lookup(
+        self,
+        kind: str,
+        query: str,
+        max_results: int,
+        fetch: Callable[[int], Awaitable[list[dict[str, any]]]],
+    ) -> list[dict[str, any]] | None:
+        """
+        Return cached results without fetching on a miss.
+
+        A stale entry is still returned and refreshed in the background
+        with fetch, as in get_or_fetch.
+
+        Returns:
+            list of at most max_results results, or None on a miss
+        """
+        key = (kind, normalize_query(query))
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None and now >= entry.stale_until:
+            del self._entries[key]
+            entry = None
+
+        if entry is not None and entry.max_results >= max_results:
+            self._entries.move_to_end(key)
+            if now >= entry.fresh_until:
+                self.stale_hits += 1
+                self._revalidate(key, entry.max_results, fetch)
+            elif entry.max_results > max_results:
+                self.superset_hits += 1
+            else:
+                self.hits += 1
+            return entry.results[:max_results]
+
+        self.misses += 1
+        return None
+
+    def store(self, kind: str, query: str, max_results: int, results: list[dict[str, any]]) -> None:
+        """Cache results fetched outside get_or_fetch, e.g. by a streamed search."""
+        self._store((kind, normalize_query(query)), max_results, results)
+
+    async def _fetch(
+        self,
+        key: tuple[str, str],
+        max_results: int,
+        fetch: Callable[[int], Awaitable[list[dict[str, any]]]],
+    ) -> list[dict[str, any]]:
+        results = await fetch(max_results)
+        self._store(key, max_results, results)
+        return results
+
+    def _store(self, key: tuple[str, str], max_results: int, results: list[dict[str, any]]) -> None:
+        current = self._entries.get(key)
+        # Never replace a larger fresh result set with a smaller one
+        if current is None or current.max_results <= max_results or time.monotonic() >= current.fresh_until:
+            self._entries[key] = _SearchEntry(max_results, results, self.ttl, self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _revalidate(
+        self,
+        key: tuple[str, str],
+        max_results: int,
+        fetch: Callable[[int], Awaitable[list[dict[str, any]]]],
+    ) -> None:
+        if self._flight.in_flight((key, max_results)):
+            return
+        self.revalidations += 1
+
+        async def refresh() -> None:
+            try:
+                await self._flight.do((key, max_results), lambda: self._fetch(key, max_results, fetch))
+            except Exception as e:
+                logger.warning(f"Background refresh of search {key} failed: {e}")
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get cache counters.
+
+        Returns:
+            dictionary with entry count, hit kinds, misses, refreshes and hit ratio
+        """
+        hits = self.hits + self.superset_hits + self.stale_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "superset_hits": self.superset_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "evictions": self.evictions,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
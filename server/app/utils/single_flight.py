@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight task.
+
+    The first caller for a key (the leader) starts the work; every caller
+    that arrives while it is still running awaits the same task and gets the
+    same result or exception. The task is shielded, so a disconnecting client
+    does not cancel work other callers are waiting on.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[any, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: any, fn: Callable[[], Awaitable[any]]) -> any:
+        """
+        Run fn for key, or join the call already in flight for it.
+
+        Args:
+            key: Identity of the work, e.g. a video ID
+            fn: Zero-argument coroutine factory performing the work
+
+        Returns:
+            The result of the shared call
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: any, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self, key: any) -> bool:
+        """Return True if a call for key is currently running."""
+        return key in self._inflight
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            dictionary with total calls, executions and calls that joined one
+        """
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+            "in_flight": len(self._inflight),
+        }
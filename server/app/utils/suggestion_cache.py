@@ -0,0 +1,221 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+class _TrieNode:
+    __slots__ = ("children", "suggestions", "expires_at")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "_TrieNode"] = {}
+        self.suggestions: list[str] | None = None
+        self.expires_at = 0.0
+
+
+class SuggestionTrie:
+    """
+    Prefix trie of cached autocomplete results with TTL and an entry cap.
+
+    Each cached query stores its upstream completions on the trie node of
+    that query. A lookup for "lofi" is answered from "lofi" itself or, if
+    that is not cached, by filtering the completions of the longest cached
+    prefix ("lof", "lo", ...) down to the ones that still match. Only a
+    prefix with fewer than `upstream_cap` completions is used that way: a
+    full list is a truncated top-N, and filtering it would answer "lofi"
+    with the one or two "lo" completions that happen to match. Once
+    `max_entries` queries are cached the least recently used one is dropped.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 600, upstream_cap: int = 10) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.upstream_cap = upstream_cap
+        self._root = _TrieNode()
+        self._lru: OrderedDict[str, None] = OrderedDict()
+        self.exact_hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    def _node(self, query: str, create: bool = False) -> _TrieNode | None:
+        node = self._root
+        for char in query:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _TrieNode()
+            node = child
+        return node
+
+    def get(self, query: str) -> list[str] | None:
+        """
+        Look up completions for an already normalized query.
+
+        Args:
+            query: Normalized query string
+
+        Returns:
+            list of suggestions, or None on a miss
+        """
+        now = time.monotonic()
+        node = self._root
+        best: tuple[str, list[str]] | None = None
+        for depth, char in enumerate(query, start=1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.suggestions is None or node.expires_at <= now:
+                continue
+            # A shorter prefix is only usable if its list is exhaustive
+            if depth == len(query) or len(node.suggestions) < self.upstream_cap:
+                best = (query[:depth], node.suggestions)
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        prefix, suggestions = best
+        self._lru.move_to_end(prefix)
+        if prefix == query:
+            self.exact_hits += 1
+            return suggestions
+
+        filtered = [s for s in suggestions if s.casefold().startswith(query)]
+        if not filtered:
+            self.misses += 1
+            return None
+        self.prefix_hits += 1
+        return filtered
+
+    def set(self, query: str, suggestions: list[str]) -> None:
+        """Cache the upstream completions of a normalized query."""
+        node = self._node(query, create=True)
+        node.suggestions = suggestions
+        node.expires_at = time.monotonic() + self.ttl
+        self._lru[query] = None
+        self._lru.move_to_end(query)
+
+        while len(self._lru) > self.max_entries:
+            oldest, _ = self._lru.popitem(last=False)
+            self._remove(oldest)
+
+    def _remove(self, query: str) -> None:
+        # Clear the entry, then prune nodes that no longer lead anywhere
+        path = [self._root]
+        for char in query:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].suggestions = None
+
+        for depth in range(len(query), 0, -1):
+            node = path[depth]
+            if node.children or node.suggestions is not None:
+                break
+            del path[depth - 1].children[query[depth - 1]]
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get cache counters.
+
+        Returns:
+            dictionary with entry count, exact and prefix hits, misses and hit ratio
+        """
+        hits = self.exact_hits + self.prefix_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SuggestionDebouncer:
+    """
+    Collapses a client's burst of keystrokes into one upstream call.
+
+    Each request waits `window` seconds. If the same client sent a longer
+    query in the meantime ("lof" then "lofi"), the older request does not
+    go upstream: it waits for the newer one and reuses its completions,
+    which all start with the older prefix as well.
+    """
+
+    def __init__(self, window: float = 0.15) -> None:
+        self.window = window
+        self._latest: dict[str, tuple[str, asyncio.Future]] = {}
+        self.requests = 0
+        self.collapsed = 0
+
+    async def run(
+        self,
+        client_id: str,
+        query: str,
+        fetch: Callable[[str], Awaitable[any]],
+    ) -> any:
+        """
+        Debounce a request, then fetch or piggyback on a newer one.
+
+        Args:
+            client_id: Identity of the requesting client, e.g. a user ID
+            query: Normalized query string
+            fetch: Coroutine function fetching completions for a query
+
+        Returns:
+            Result of fetch, either this request's or the newer one's
+        """
+        self.requests += 1
+        if self.window <= 0:
+            return await fetch(query)
+
+        future = asyncio.get_running_loop().create_future()
+        # Failed results are still retrieved by whoever awaits them, if anyone
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        entry = (query, future)
+        self._latest[client_id] = entry
+
+        try:
+            await asyncio.sleep(self.window)
+            newer = self._latest.get(client_id)
+            if newer is not None and newer is not entry and newer[0].startswith(query):
+                self.collapsed += 1
+                try:
+                    result = await asyncio.shield(newer[1])
+                except asyncio.CancelledError:
+                    if not newer[1].cancelled():
+                        raise
+                    # The newer request was cancelled, not this one: fetch for ourselves
+                    result = await fetch(query)
+            else:
+                result = await fetch(query)
+            if not future.done():
+                future.set_result(result)
+            return result
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if self._latest.get(client_id) is entry:
+                del self._latest[client_id]
+
+    def stats(self) -> dict[str, int]:
+        """Return how many requests were debounced and collapsed."""
+        return {
+            "requests": self.requests,
+            "collapsed": self.collapsed,
+            "pending_clients": len(self._latest),
+        }
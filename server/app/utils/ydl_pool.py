@@ -0,0 +1,135 @@
+import copy
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from yt_dlp import YoutubeDL
+from app.logger import logger
+
+_MISSING = object()
+
+
+class YoutubeDLPool:
+    """
+    Pool of pre-initialised YoutubeDL instances sharing one option profile.
+
+    Instances are checked out and returned like DB connections, so their
+    extractors, cookie jar and HTTP sessions survive between calls. At most
+    `max_size` instances exist at once; an instance is closed and replaced
+    after `max_uses` checkouts, or straight away if a call using it raised.
+    Checkouts block the calling thread while the pool is exhausted, so the
+    pool is meant to be used from executor threads, never the event loop.
+    """
+
+    def __init__(self, name: str, opts: dict[str, any], max_size: int = 5, max_uses: int = 100) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer")
+
+        self.name = name
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self._opts = opts
+        self._idle: list[tuple[YoutubeDL, int]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.created = 0
+        self.recycled = 0
+        self.checkouts = 0
+        self.reused = 0
+
+    def _create(self) -> YoutubeDL:
+        ydl = YoutubeDL(copy.deepcopy(self._opts))
+        with self._lock:
+            self.created += 1
+        return ydl
+
+    def _close(self, ydl: YoutubeDL) -> None:
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"Error closing YoutubeDL instance of pool {self.name}: {e}")
+        with self._lock:
+            self.recycled += 1
+
+    def warm(self, count: int | None = None) -> None:
+        """
+        Pre-create idle instances so the first requests skip construction.
+
+        Args:
+            count: Number of idle instances to hold (default: max_size)
+        """
+        count = self.max_size if count is None else min(count, self.max_size)
+        while True:
+            with self._lock:
+                if len(self._idle) >= count:
+                    break
+            ydl = self._create()
+            with self._lock:
+                self._idle.append((ydl, 0))
+        logger.info(f"YoutubeDL pool {self.name} warmed with {count} instances")
+
+    @contextmanager
+    def checkout(self, overrides: dict[str, any] | None = None) -> Iterator[YoutubeDL]:
+        """
+        Borrow an instance from the pool.
+
+        Args:
+            overrides: Params applied for this checkout only, e.g. playlistend
+
+        Yields:
+            A YoutubeDL instance, returned to the pool on exit
+        """
+        self._slots.acquire()
+        try:
+            with self._lock:
+                self.checkouts += 1
+                ydl, uses = self._idle.pop() if self._idle else (None, 0)
+                if ydl is not None:
+                    self.reused += 1
+            if ydl is None:
+                ydl = self._create()
+
+            saved = {key: ydl.params.get(key, _MISSING) for key in (overrides or {})}
+            ydl.params.update(overrides or {})
+            healthy = False
+            try:
+                yield ydl
+                healthy = True
+            finally:
+                for key, value in saved.items():
+                    if value is _MISSING:
+                        ydl.params.pop(key, None)
+                    else:
+                        ydl.params[key] = value
+
+                uses += 1
+                if healthy and uses < self.max_uses:
+                    with self._lock:
+                        self._idle.append((ydl, uses))
+                else:
+                    self._close(ydl)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close every idle instance."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ydl, _ in idle:
+            self._close(ydl)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get pool counters.
+
+        Returns:
+            dictionary with idle count, instances created, recycled and checkouts
+        """
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "created": self.created,
+                "recycled": self.recycled,
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+            }
@@ -0,0 +1,96 @@
+"""
+Benchmark: PostgREST queries through run_in_threadpool vs the async client.
+
+Fires a burst of concurrent single-row selects at a local PostgREST
+stand-in with a fixed round-trip latency. "threadpool" is the old path, a
+sync postgrest builder executed with run_in_threadpool, competing for
+AnyIO's 40 worker threads with `busy` concurrent blocking calls that stand
+in for file I/O. "async" runs the same burst on AsyncRestClient with its
+own connection pool and concurrency limit, next to the same blocking load.
+
+Run from the server directory:
+    python -m benchmarks.bench_async_postgrest [queries] [concurrency] [latency_ms] [busy]
+"""
+import asyncio
+import os
+import sys
+import time
+from benchmarks.bench_plan_catalog import PLANS, report, start_stand_in
+
+BUSY_SECONDS = 0.2
+
+
+def blocking_io() -> None:
+    time.sleep(BUSY_SECONDS)
+
+
+async def background_io(run_in_threadpool, busy: int, stop: asyncio.Event) -> None:
+    """Keep `busy` blocking calls in the shared thread pool until stopped."""
+    async def worker() -> None:
+        while not stop.is_set():
+            await run_in_threadpool(blocking_io)
+
+    await asyncio.gather(*(worker() for _ in range(busy)))
+
+
+async def burst(run_query, queries: int, concurrency: int) -> tuple[list[float], float]:
+    """Run `queries` lookups with at most `concurrency` issued at once."""
+    gate = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(i: int) -> None:
+        async with gate:
+            start = time.perf_counter()
+            response = await run_query(PLANS[i % len(PLANS)]["id"])
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.data
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    return timings, time.perf_counter() - start
+
+
+async def measure(label: str, run_query, run_in_threadpool, queries: int, concurrency: int, busy: int) -> None:
+    stop = asyncio.Event()
+    load = asyncio.create_task(background_io(run_in_threadpool, busy, stop))
+    await asyncio.sleep(0.05)
+    timings, elapsed = await burst(run_query, queries, concurrency)
+    stop.set()
+    await load
+    report(label, timings)
+    print(f"{'':<10} {queries / elapsed:8.1f} queries/s over {elapsed:.2f} s")
+
+
+async def main(queries: int, concurrency: int, latency_ms: float, busy: int) -> None:
+    url, stand_in = start_stand_in(latency_ms)
+
+    os.environ.setdefault("SUPABASE_URL", url)
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    from fastapi.concurrency import run_in_threadpool
+    from postgrest import SyncPostgrestClient
+    from app.db.async_client import AsyncRestClient
+
+    table = SyncPostgrestClient(f"{url}/rest/v1").from_("pricing_plans")
+    rest = AsyncRestClient(url, "bench", max_connections=concurrency, max_concurrency=concurrency)
+
+    async def threadpool_query(plan_id: str) -> any:
+        return await run_in_threadpool(table.select("*").eq("id", plan_id).execute)
+
+    async def async_query(plan_id: str) -> any:
+        return await rest.execute(rest.table("pricing_plans").select("*").eq("id", plan_id))
+
+    print(f"{queries} queries, {concurrency} concurrent, stand-in latency {latency_ms} ms, {busy} blocking calls in the thread pool")
+    await measure("threadpool", threadpool_query, run_in_threadpool, queries, concurrency, busy)
+    await measure("async", async_query, run_in_threadpool, queries, concurrency, busy)
+    print(f"async client stats: {rest.stats()}")
+    await rest.aclose()
+    stand_in.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 600,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 50,
+        int(sys.argv[4]) if len(sys.argv) > 4 else 35,
+    ))
@@ -0,0 +1,115 @@
+"""
+Benchmark: plan lookup of /create-payment, per-request query vs in-memory catalog.
+
+Serves pricing_plans from a local PostgREST stand-in that adds a fixed
+round-trip latency, then times the plan lookup the payment route does
+before creating the Razorpay order: first as the old single-row select
+through the thread pool, then through a loaded PlanCatalog.
+
+Run from the server directory:
+    python -m benchmarks.bench_plan_catalog [iterations] [latency_ms]
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+PLANS = [
+    {"id": f"plan-{i}", "max_video_quality": quality, "price_inr": price, "validity_days": 30}
+    for i, (quality, price) in enumerate([("480p", 0), ("720p", 4900), ("1080p", 9900), ("2160p", 19900)])
+]
+
+
+def _rows(path: str) -> list[dict[str, any]]:
+    query = parse_qs(urlparse(path).query)
+    if "id" in query:
+        plan_id = query["id"][0].removeprefix("eq.")
+        return [plan for plan in PLANS if plan["id"] == plan_id]
+    return PLANS
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, latency: float) -> None:
+    """Answer keep-alive GETs on pricing_plans after `latency` seconds each."""
+    try:
+        while request_line := await reader.readline():
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            await asyncio.sleep(latency)
+            body = json.dumps(_rows(request_line.split()[1].decode())).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _serve(latency: float, ready: multiprocessing.Queue) -> None:
+    async def serve() -> None:
+        server = await asyncio.start_server(lambda r, w: _handle(r, w, latency), "127.0.0.1", 0, backlog=1024)
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_stand_in(latency_ms: float) -> tuple[str, multiprocessing.Process]:
+    """Serve a PostgREST stand-in from its own process, so it does not compete for the benchmark's GIL."""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(latency_ms / 1000, ready), daemon=True)
+    process.start()
+    return f"http://127.0.0.1:{ready.get(timeout=10)}", process
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<10} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+async def measure(lookup, iterations: int) -> list[float]:
+    timings = []
+    for i in range(iterations):
+        plan_id = PLANS[i % len(PLANS)]["id"]
+        start = time.perf_counter()
+        plan = await lookup(plan_id)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert plan and plan["id"] == plan_id
+    return timings
+
+
+async def main(iterations: int, latency_ms: float) -> None:
+    url, stand_in = start_stand_in(latency_ms)
+
+    os.environ.setdefault("SUPABASE_URL", url)
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    from fastapi.concurrency import run_in_threadpool
+    from postgrest import SyncPostgrestClient
+    from app.db.async_client import AsyncRestClient
+    from app.db.plan_catalog import PlanCatalog
+
+    table = SyncPostgrestClient(f"{url}/rest/v1").from_("pricing_plans")
+
+    async def per_request(plan_id: str) -> dict[str, any]:
+        response = await run_in_threadpool(table.select("*").eq("id", plan_id).execute)
+        return response.data[0]
+
+    catalog = PlanCatalog(AsyncRestClient(url, "bench"), refresh_interval=0)
+    await catalog.start()
+
+    print(f"stand-in latency {latency_ms} ms, {iterations} lookups")
+    report("query", await measure(per_request, iterations))
+    report("catalog", await measure(catalog.get, iterations))
+    print(f"catalog stats: {catalog.stats()}")
+    stand_in.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    ))
@@ -0,0 +1,125 @@
+"""
+Benchmark: time to first search result, batch extraction vs streamed entries.
+
+"batch" is the /video/search path: one flat extraction that returns only
+after yt-dlp has fetched every result page. "stream" is the
+/video/search/stream path: extract_info with process=False, its entries
+handed from the extraction engine to the event loop one by one.
+
+By default the search runs against a stand-in search extractor that
+serves pages of 20 results (YouTube's search page size) after `page_ms`
+each, so runs are repeatable offline. Pass "youtube" as the source to
+search YouTube itself with the real extractor functions.
+
+Run from the server directory:
+    python -m benchmarks.bench_search_stream [max_results] [page_ms] [rounds] [source] [mode]
+"""
+import asyncio
+import itertools
+import os
+import sys
+import time
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.common import SearchInfoExtractor
+
+QUERY = "lofi hip hop"
+PAGE_SIZE = 20
+
+
+class PagedSearchIE(SearchInfoExtractor):
+    """Stand-in for YoutubeSearchIE: pages of PAGE_SIZE flat results, each after a fixed delay."""
+
+    _SEARCH_KEY = "benchsearch"
+    _MAX_RESULTS = float("inf")
+
+    def _search_results(self, query):
+        delay = self.get_param("bench_page_ms", 0) / 1000
+        for page in itertools.count():
+            time.sleep(delay)
+            for i in range(PAGE_SIZE):
+                n = page * PAGE_SIZE + i
+                yield self.url_result(
+                    f"https://www.youtube.com/watch?v=bench{n:06d}", "Youtube", f"bench{n:06d}", f"{query} {n}",
+                    duration=180, uploader="bench",
+                )
+
+
+def _stand_in(page_ms: float) -> YoutubeDL:
+    ydl = YoutubeDL({"quiet": True, "extract_flat": True, "bench_page_ms": page_ms}, auto_init=False)
+    ydl.add_info_extractor(PagedSearchIE())
+    return ydl
+
+
+def batch_stand_in(url: str, page_ms: float) -> dict[str, any]:
+    """Blocking: the stand-in search run like extract_flat, all entries at once."""
+    info = _stand_in(page_ms).extract_info(url, download=False, ie_key="PagedSearch")
+    return {"entries": [{"id": entry["id"], "title": entry["title"]} for entry in info["entries"]]}
+
+
+def iter_stand_in(url: str, page_ms: float):
+    """Blocking generator: the stand-in search run like iter_flat, entries as produced."""
+    info = _stand_in(page_ms).extract_info(url, download=False, ie_key="PagedSearch", process=False)
+    for entry in info["entries"]:
+        yield {"id": entry["id"], "title": entry["title"]}
+
+
+async def time_batch(engine, fn, *args) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    info = await engine.run(fn, *args)
+    elapsed = (time.perf_counter() - start) * 1000
+    # Nothing can be sent before the whole extraction returns
+    return elapsed, elapsed, len(info["entries"])
+
+
+async def time_stream(engine, fn, *args) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first, count = None, 0
+    async for _ in engine.stream(fn, *args):
+        count += 1
+        if first is None:
+            first = (time.perf_counter() - start) * 1000
+    return first, (time.perf_counter() - start) * 1000, count
+
+
+def report(label: str, samples: list[tuple[float, float, int]]) -> None:
+    first = sorted(sample[0] for sample in samples)
+    total = sorted(sample[1] for sample in samples)
+    print(
+        f"{label:<8} first result p50 {first[len(first) // 2]:8.1f} ms   "
+        f"last result p50 {total[len(total) // 2]:8.1f} ms   results {samples[-1][2]}"
+    )
+
+
+async def main(max_results: int, page_ms: float, rounds: int, source: str, mode: str) -> None:
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    from app.services.extractor import SEARCH_FLAT, ExtractionEngine, extract_flat, iter_flat
+
+    engine = ExtractionEngine(mode, max_workers=2)
+    await engine.start()
+    if source == "youtube":
+        url = f"ytsearch{max_results}:{QUERY}"
+        batch_args, stream_args = (extract_flat, SEARCH_FLAT, url), (iter_flat, SEARCH_FLAT, url)
+    else:
+        url = f"benchsearch{max_results}:{QUERY}"
+        batch_args, stream_args = (batch_stand_in, url, page_ms), (iter_stand_in, url, page_ms)
+
+    print(f"{max_results} results from {source}, {rounds} rounds, {mode} engine"
+          + (f", {page_ms:g} ms per page of {PAGE_SIZE}" if source != "youtube" else ""))
+    batch, stream = [], []
+    for _ in range(rounds):
+        batch.append(await time_batch(engine, *batch_args))
+        stream.append(await time_stream(engine, *stream_args))
+    report("batch", batch)
+    report("stream", stream)
+    engine.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 400,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 5,
+        sys.argv[4] if len(sys.argv) > 4 else "stand-in",
+        sys.argv[5] if len(sys.argv) > 5 else "thread",
+    ))
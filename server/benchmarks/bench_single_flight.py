@@ -0,0 +1,69 @@
+"""
+Benchmark for single-flight coalescing of video info cache misses.
+
+Fires N concurrent requests per video ID at a stubbed extractor that sleeps
+like a yt-dlp extraction would, once without coalescing and once through
+SingleFlight, and reports extractions per key and wall time.
+
+Run from the server directory:
+    python -m benchmarks.bench_single_flight [requests_per_key] [keys]
+"""
+import asyncio
+import sys
+import time
+from collections import Counter
+from app.utils.single_flight import SingleFlight
+
+EXTRACTION_SECONDS = 0.5
+
+
+class StubExtractor:
+    """Stands in for the yt-dlp extraction and counts calls per video ID."""
+
+    def __init__(self) -> None:
+        self.calls = Counter()
+
+    async def extract(self, video_id: str) -> dict[str, any]:
+        self.calls[video_id] += 1
+        await asyncio.sleep(EXTRACTION_SECONDS)
+        return {"video_id": video_id, "title": f"Video {video_id}"}
+
+
+async def run_uncoalesced(video_ids: list[str], per_key: int) -> tuple[StubExtractor, float]:
+    extractor = StubExtractor()
+    start = time.perf_counter()
+    await asyncio.gather(*(extractor.extract(v) for v in video_ids for _ in range(per_key)))
+    return extractor, time.perf_counter() - start
+
+
+async def run_coalesced(video_ids: list[str], per_key: int) -> tuple[StubExtractor, float, SingleFlight]:
+    extractor = StubExtractor()
+    flight = SingleFlight()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        flight.do(v, lambda v=v: extractor.extract(v))
+        for v in video_ids for _ in range(per_key)
+    ))
+    return extractor, time.perf_counter() - start, flight
+
+
+async def main(per_key: int, keys: int) -> None:
+    video_ids = [f"vid{i:08d}" for i in range(keys)]
+    total = per_key * keys
+
+    plain, plain_time = await run_uncoalesced(video_ids, per_key)
+    shared, shared_time, flight = await run_coalesced(video_ids, per_key)
+
+    print(f"{total} requests over {keys} video IDs ({per_key} concurrent per key)")
+    print(f"{'mode':<12} {'extractions':>12} {'max/key':>8} {'wall (s)':>9}")
+    print(f"{'plain':<12} {sum(plain.calls.values()):>12} {max(plain.calls.values()):>8} {plain_time:>9.3f}")
+    print(f"{'coalesced':<12} {sum(shared.calls.values()):>12} {max(shared.calls.values()):>8} {shared_time:>9.3f}")
+    print(f"single-flight stats: {flight.stats()}")
+
+    assert all(count == 1 for count in shared.calls.values()), "expected one extraction per key"
+
+
+if __name__ == "__main__":
+    per_key = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    keys = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    asyncio.run(main(per_key, keys))
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: YoutubeDL constructed per call vs checked out of a warm pool.
+
+Each iteration does what every extraction used to pay for up front: build
+the YoutubeDL object and instantiate the YouTube extractors. No network
+access is needed.
+
+Run from the server directory:
+    python -m benchmarks.bench_ydl_pool [iterations]
+"""
+import statistics
+import sys
+import time
+from yt_dlp import YoutubeDL
+from app.utils.ydl_pool import YoutubeDLPool
+
+OPTS = {
+    "quiet": True,
+    "retries": 3,
+    "extract_flat": True,
+    "noplaylist": True,
+}
+EXTRACTORS = ("Youtube", "YoutubeSearch", "YoutubeTab")
+
+
+def per_call() -> None:
+    with YoutubeDL(dict(OPTS)) as ydl:
+        for name in EXTRACTORS:
+            ydl.get_info_extractor(name)
+
+
+def pooled(pool: YoutubeDLPool) -> None:
+    with pool.checkout() as ydl:
+        for name in EXTRACTORS:
+            ydl.get_info_extractor(name)
+
+
+def measure(fn, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<10} mean {statistics.mean(timings):8.3f} ms   p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main(iterations: int) -> None:
+    pool = YoutubeDLPool("bench", OPTS, max_size=1, max_uses=iterations + 1)
+    pool.warm()
+
+    report("per-call", measure(per_call, iterations))
+    report("pooled", measure(lambda: pooled(pool), iterations))
+    print(f"pool stats: {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,17 @@
+-- Batched, atomic increment of cached_formats.access_count, used by
+-- AccessCounter to flush the accesses it buffers in memory.
+--
+-- hits is a JSON array of {"video_id": ..., "tag": ..., "count": ...}.
+-- Apply with the Supabase SQL editor or `psql -f sql/access_counts.sql`.
+
+create or replace function public.increment_format_access(hits json)
+returns void
+language sql
+volatile
+as $$
+    update public.cached_formats as f
+    set access_count = coalesce(f.access_count, 0) + h.count
+    from json_to_recordset(hits) as h(video_id text, tag text, count integer)
+    where f.video_id = h.video_id
+      and f.tag = h.tag;
+$$;
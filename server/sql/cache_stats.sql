@@ -0,0 +1,31 @@
+-- Aggregate statistics of the cached_formats table, used by
+-- DatabaseManager.get_cache_stats instead of downloading every row.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/cache_stats.sql`.
+-- Until it exists the server falls back to computing the stats in Python.
+
+create or replace function public.cache_format_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total_formats', count(*),
+        'unique_videos', count(distinct video_id),
+        'total_size_bytes', coalesce(sum(filesize), 0),
+        'audio_files', count(*) filter (where acodec is not null and acodec <> 'none'),
+        'audio_size_bytes', coalesce(sum(filesize) filter (where acodec is not null and acodec <> 'none'), 0),
+        'video_files', count(*) filter (where vcodec is not null and vcodec <> 'none'),
+        'video_size_bytes', coalesce(sum(filesize) filter (where vcodec is not null and vcodec <> 'none'), 0),
+        'format_breakdown', (
+            select coalesce(json_object_agg(tag, tag_count), '{}'::json)
+            from (
+                select tag, count(*) as tag_count
+                from public.cached_formats
+                group by tag
+            ) as tags
+        )
+    )
+    from public.cached_formats;
+$$;
+
@@ -0,0 +1,24 @@
+-- Playlist entries stored apart from the playlist metadata, so huge
+-- playlists can be loaded in windows and served page by page.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/playlist_entries.sql`.
+-- Older cached_playlist rows keep their inline videos column; entries_loaded
+-- stays null for them and the server pages that list instead.
+
+create table if not exists public.cached_playlist_entries (
+    playlist_id text not null,
+    position integer not null,
+    video_id text not null,
+    title text,
+    thumbnail text,
+    duration double precision,
+    uploader text,
+    upload_date text,
+    description text,
+    created_at timestamptz not null default now(),
+    primary key (playlist_id, position)
+);
+
+alter table public.cached_playlist
+    add column if not exists entries_loaded integer,
+    add column if not exists entries_complete boolean not null default true;
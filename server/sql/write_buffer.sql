@@ -0,0 +1,14 @@
+-- Unique keys the write-behind buffer (app/db/write_buffer.py) upserts on.
+-- PostgREST needs a unique constraint or index matching on_conflict.
+--
+-- Apply with the Supabase SQL editor or `psql -f sql/write_buffer.sql`.
+-- downloads is upserted on its primary key and needs nothing here.
+
+create unique index if not exists cached_info_video_id_key
+    on public.cached_info (video_id);
+
+create unique index if not exists cached_playlist_playlist_id_key
+    on public.cached_playlist (playlist_id);
+
+create unique index if not exists cached_formats_video_id_tag_key
+    on public.cached_formats (video_id, tag);